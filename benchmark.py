@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmarks the Better Leaves Lite generator on a synthetic modpack, reporting time, memory and file operations per stage as JSON."""
+
+# Depencency imports
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from PIL import Image
+
+# Local imports
+from gen_pack import parseArgs, writeMetadata, zipName
+from src.generator import autoGen
+from src.output_utils import AssetFolder, AssetTree, MemoryBudget
+from src.profiler import StagePeak
+from src.zip_utils import makeZip
+
+# Files of the repository that are needed to build the pack
+repoFiles = ["base", "input/masks", "input/overrides.json", "input/pack.mcmeta", "pack.png", "pack_programmer_art.png", "LICENSE", "README.md"]
+
+# Audit events that count as file operations
+fileEvents = {"open", "os.listdir", "os.scandir", "os.mkdir", "os.remove", "os.rename", "os.rmdir", "shutil.copyfile", "shutil.rmtree"}
+fileOps = None # Counter of the currently measured stage (operations of worker processes are not included)
+
+def countFileOps(event, args):
+    if fileOps != None and event in fileEvents: fileOps[event] = fileOps.get(event, 0) + 1
+
+def randomTexture(rng, width, height):
+    texture = Image.new("RGBA", (width, height))
+    texture.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256), rng.choice((0, 255))) for i in range(width * height)])
+    data = io.BytesIO()
+    texture.save(data, "PNG")
+    return data.getvalue()
+
+def createModpack(folder, options):
+    # Creates a synthetic input folder with leaves, animated leaves, texture stitching data and texturepacks
+    rng = random.Random(options.seed)
+    for path in repoFiles:
+        if os.path.isdir(path): shutil.copytree(path, os.path.join(folder, path))
+        else:
+            os.makedirs(os.path.dirname(os.path.join(folder, path)), exist_ok=True)
+            shutil.copyfile(path, os.path.join(folder, path))
+
+    textureFolder = os.path.join(folder, "input/assets/benchmark/textures/block")
+    os.makedirs(textureFolder)
+    for i in range(options.leaves):
+        animated = rng.random() < options.animated
+        with open(os.path.join(textureFolder, f"leaves_{i}.png"), "wb") as f:
+            f.write(randomTexture(rng, options.size, options.size * (4 if animated else 1)))
+        if animated:
+            with open(os.path.join(textureFolder, f"leaves_{i}.png.mcmeta"), "w") as f:
+                json.dump({"animation": {"frametime": 4}}, f)
+        elif i > 0 and rng.random() < options.stitching:
+            with open(os.path.join(textureFolder, f"leaves_{i}.betterleaves.json"), "w") as f:
+                json.dump({"textureStitching": {"1-3": f"benchmark:block/leaves_{rng.randrange(i)}"}}, f)
+
+    os.makedirs(os.path.join(folder, "input/texturepacks"))
+    for pack in range(options.packs):
+        with zipfile.ZipFile(os.path.join(folder, "input/texturepacks", f"pack_{pack}.zip"), "w", zipfile.ZIP_DEFLATED) as zipf:
+            zipf.writestr("pack.mcmeta", json.dumps({"pack": {"pack_format": 15, "description": f"Benchmark pack {pack}"}}))
+            for i in range(options.leaves):
+                if rng.random() < options.overrides:
+                    zipf.writestr(f"assets/benchmark/textures/block/leaves_{i}.png", randomTexture(rng, options.pack_size, options.pack_size))
+            # Texturepacks contain a lot more than leaves
+            zipf.writestr("assets/minecraft/sounds/filler.ogg", rng.randbytes(options.pack_filler * 1024))
+    os.makedirs(os.path.join(folder, "input/mods"), exist_ok=True)
+
+@contextlib.contextmanager
+def stage(report, name):
+    global fileOps
+    fileOps = {}
+    tracemalloc.reset_peak()
+    memory = StagePeak()
+    start = time.perf_counter()
+    try: yield
+    finally:
+        report[name] = {
+            "seconds": round(time.perf_counter() - start, 4),
+            "peakPythonBytes": tracemalloc.get_traced_memory()[1], # Python objects only, without the pixels held by Pillow
+            "peakRssKiB": memory.finish(), # Of this stage on Linux, of the process so far elsewhere
+            "fileOps": dict(sorted(fileOps.items()))
+        }
+        fileOps = None
+
+# Dependencies that should only be imported by the commands that need them
+heavyModules = ("PIL", "numpy", "requests", "tqdm")
+# What each command imports, on top of the entry point
+startupCommands = {
+    "help": [os.path.abspath("gen_pack.py"), "--help"],
+    "build": ["-c", "import gen_pack, src.generator, src.output_utils, src.zip_utils"],
+    "download": ["-c", "import gen_pack, src.download_helper"],
+    "zip": ["-c", "import gen_pack, src.output_utils, src.zip_utils"]
+}
+
+def importTimes(command):
+    # Cumulative import time of each module in a fresh interpreter (-X importtime), in microseconds
+    result = subprocess.run([sys.executable, "-X", "importtime"] + command, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    imports = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line: continue
+        self, cumulative, module = line[len("import time:"):].split("|")
+        # Nested imports are indented, their time is included in the module that imported them
+        if cumulative.strip().isdigit(): imports[module.strip()] = (int(cumulative), not module.startswith("  "))
+    return imports
+
+def measureStartup():
+    # Modules every interpreter imports (site, encodings, ...) are left out
+    baseline = importTimes(["-c", "pass"])
+    startup = {}
+    for name, command in startupCommands.items():
+        imports = {module: entry for module, entry in importTimes(command).items() if module not in baseline}
+        topLevel = {module: time for module, (time, isTopLevel) in imports.items() if isTopLevel}
+        startup[name] = {
+            "importMicroseconds": sum(topLevel.values()),
+            "slowestImports": dict(sorted(topLevel.items(), key=lambda entry: entry[1], reverse=True)[:5]),
+            "heavyModules": [module for module in heavyModules if module in imports]
+        }
+    return startup
+
+def runBuild(args, verbose):
+    report = {}
+    with open("./input/overrides.json") as f: data = json.load(f)
+    budget = MemoryBudget(args.memory_budget)
+    output = AssetTree(budget=budget) if args.in_memory else AssetFolder(budget=budget)
+    with contextlib.redirect_stdout(sys.stdout if verbose else io.StringIO()):
+        with stage(report, "generate"): autoGen(data, args, output)
+        with stage(report, "metadata"): writeMetadata(args)
+        with stage(report, "zip"): makeZip(zipName(args), output, args.programmer, compression=args.compression)
+    report["total"] = {"seconds": round(sum(entry["seconds"] for entry in report.values()), 4)}
+    report["zipBytes"] = os.path.getsize(zipName(args))
+    return report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+                    description='Benchmarks the generator on a synthetic modpack. Arguments after "--" are passed on to gen_pack.py.',
+                    epilog='Example: python benchmark.py --leaves 1000 --size 32 --packs 3 -- --jobs 4')
+    parser.add_argument('--leaves', type=int, default=600, help="Number of leaf textures")
+    parser.add_argument('--size', type=int, default=16, choices=[16, 32, 64], help="Resolution of the leaf textures")
+    parser.add_argument('--packs', type=int, default=2, help="Number of texturepacks")
+    parser.add_argument('--pack-size', type=int, default=32, choices=[16, 32, 64], help="Resolution of the texturepack textures")
+    parser.add_argument('--pack-filler', type=int, default=1024, help="KiB of unrelated files in each texturepack")
+    parser.add_argument('--overrides', type=float, default=0.3, help="Share of leaves each texturepack overrides")
+    parser.add_argument('--animated', type=float, default=0.05, help="Share of animated leaf textures")
+    parser.add_argument('--stitching', type=float, default=0.05, help="Share of leaves with texture stitching data")
+    parser.add_argument('--runs', type=int, default=1, help="Number of builds in the same folder (later runs use the build cache)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', '-o', help="Write the JSON report to this file instead of stdout")
+    parser.add_argument('--keep', action='store_true', help="Keep the synthetic modpack folder")
+    parser.add_argument('--verbose', '-v', action='store_true', help="Show the output of the generator")
+    parser.add_argument('build_args', nargs=argparse.REMAINDER)
+    options = parser.parse_args()
+    buildArgs = parseArgs(["build", "benchmark"] + [arg for arg in options.build_args if arg != "--"])
+
+    startup = measureStartup()
+    sys.addaudithook(countFileOps)
+    tracemalloc.start()
+    folder = tempfile.mkdtemp(prefix="betterleaves-benchmark-")
+    cwd = os.getcwd()
+    try:
+        createModpack(folder, options)
+        os.chdir(folder)
+        runs = [runBuild(buildArgs, options.verbose) for i in range(options.runs)]
+    finally:
+        os.chdir(cwd)
+        if not options.keep: shutil.rmtree(folder)
+
+    result = {
+        "options": {key: value for key, value in vars(options).items() if key not in ("output", "keep", "verbose")},
+        "python": sys.version.split()[0],
+        "startup": startup,
+        "runs": runs
+    }
+    if options.keep: result["folder"] = folder
+    if options.output == None: print(json.dumps(result, indent=4))
+    else:
+        with open(options.output, "w") as f: json.dump(result, f, indent=4)
@@ -6,54 +6,187 @@
 # Depencency imports
 import argparse
 import json
+import sys
 import time
 
 # Local imports
-from src.generator import autoGen
-from src.download_helper import downloadPack
-from src.zip_utils import makeZip
-import src.json_utils
+# Everything else is imported by the command that needs it, so e.g. --help doesn't have to load PIL or requests
+from src.data.edition import Edition, displayName
+
+COMMANDS = ("build", "download", "zip", "inspect", "verify")
 
 def writeMetadata(args):
-    edition = args.edition
-    if isinstance(edition, list): edition = " ".join(args.edition)
-    with open("./input/pack.mcmeta") as infile, open("pack.mcmeta", "w") as outfile:
-        for line in infile:
-            line = line.replace("${version}", args.version).replace("${edition}", edition).replace("${year}", str(time.localtime().tm_year))
-            outfile.write(line)
+    from src.zip_utils import createMetadata
+    with open("pack.mcmeta", "w") as outfile:
+        outfile.write(createMetadata(args.version, displayName(args.edition)))
 
-# This is the main entry point, executed when the script is run
-if __name__ == '__main__':
-    start_time = time.perf_counter()
+def editionSpec(spec):
+    # Checked while parsing, so a mistyped edition is reported along with the usage
+    name = spec.partition("=")[0]
+    if name not in Edition.NAMES: raise argparse.ArgumentTypeError(f"unknown edition '{name}', choose from: {', '.join(Edition.NAMES)}")
+    return spec
+
+def createParser():
     parser = argparse.ArgumentParser(
                     description='This script can automatically generate files for the Better Leaves Lite resourcepack.',
-                    epilog='Feel free to ask for help at http://discord.midnightdust.eu/')
+                    epilog='Without a command, the arguments are passed to "build". Feel free to ask for help at http://discord.midnightdust.eu/')
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
 
-    parser.add_argument('version', type=str)
-    parser.add_argument('edition', nargs="*", type=str, default="§cCustom Edition", help="Define your edition name")
-    parser.add_argument('--legacy', '-l', action='store_true', help="Use legacy models (from 8.1) for all leaves")
-    parser.add_argument('--programmer', '-p', action='store_true', help="Use programmer art textures")
-    parser.add_argument('--minify', '-m', action='store_true', help="Minify all JSON output files")
-    parser.add_argument('--download', '-d', help="Downloads the requested resourcepack beforehand")
-    args = parser.parse_args()
+    buildParser = commands.add_parser("build", help="Generate the pack and zip it up (default)")
+    buildParser.add_argument('version', type=str)
+    buildParser.add_argument('edition', nargs="*", type=str, default="§cCustom Edition", help="Define your edition name")
+    buildParser.add_argument('--legacy', '-l', action='store_true', help="Use legacy models (from 8.1) for all leaves")
+    buildParser.add_argument('--programmer', '-p', action='store_true', help="Use programmer art textures")
+    buildParser.add_argument('--editions', '-e', nargs="+", type=editionSpec, metavar="EDITION[=NAME]", help=f"Build several editions at once, sharing everything they have in common ({', '.join(Edition.NAMES)}). Optionally followed by the edition's name, e.g. \"programmer=§7Programmer Edition\"")
+    buildParser.add_argument('--minify', '-m', action='store_true', help="Minify all JSON output files")
+    buildParser.add_argument('--download', '-d', action="append", metavar="SLUG_OR_URL", help="Downloads the requested resourcepack (Modrinth slug or zip URL) beforehand, can be used multiple times. Previous downloads are reused")
+    buildParser.add_argument('--no-cache', action='store_true', help="Regenerate all textures instead of reusing unchanged ones from the build cache")
+    buildParser.add_argument('--in-memory', action='store_true', help="Keep generated assets in memory and write them straight into the zip, instead of the ./assets folder")
+    buildParser.add_argument('--numpy', action='store_true', help="Stitch textures using NumPy (if installed), which is faster for large textures")
+    buildParser.add_argument('--optimize-png', action='store_true', help="Re-encode generated textures losslessly with the smallest PNG colour type and bit depth")
+    buildParser.add_argument('--dedupe-textures', action='store_true', help="Only keep one copy of identical generated textures and point the models to it")
+    buildParser.add_argument('--jobs', '-j', type=int, default=1, help="Number of processes used to generate textures (0 = one per CPU core)")
+    buildParser.add_argument('--memory-budget', type=int, metavar="MB", help="Limit the memory taken by generated textures that wait to be encoded and written (default: no limit), e.g. for high resolution texturepacks on machines with little memory")
+    buildParser.add_argument('--compression', choices=["fast", "max"], default="max", help="fast: store PNGs and compress the rest quickly, max: compress everything as small as possible (default)")
+    buildParser.add_argument('--manifest', action='store_true', help="Write a manifest with the size and hash of every file next to the zip, which \"verify\" checks the zip against")
+    buildParser.add_argument('--delta', action="append", metavar="[EDITION=]ZIP", help="Compare the zip with the zip of a previous release and write a delta zip with the added and changed files, as well as the manifest. With --editions, the edition the previous zip belongs to comes first, e.g. \"programmer=Better-Leaves-(Programmer-Art)-9.0.zip\"")
+    buildParser.add_argument('--watch', '-w', action='store_true', help="Keep running and regenerate the affected parts of the pack whenever the input files change")
+    buildParser.add_argument('--profile', nargs="?", const="profile.json", help="Record the time spent in each stage and write it to a Chrome trace file (default: profile.json)")
 
-    print(f"Arguments: {args}")
-    print()
-    print("Motschen's Better Leaves Lite")
-    print("https://github.com/TeamMidnightDust/BetterLeavesLite")
-    print()
-    if args.minify: src.json_utils.minify = True
-    if args.download != None: downloadPack(args.download)
+    downloadParser = commands.add_parser("download", help="Download texturepacks into ./input/texturepacks")
+    downloadParser.add_argument('sources', nargs="+", metavar="SLUG_OR_URL", help="Modrinth slugs or zip URLs. Previous downloads are reused")
+    downloadParser.add_argument('--jobs', '-j', type=int, default=8, help="Number of simultaneous downloads")
+
+    zipParser = commands.add_parser("zip", help="Zip up the ./assets folder of a previous build")
+    zipParser.add_argument('version', type=str)
+    zipParser.add_argument('edition', nargs="*", type=str, default="§cCustom Edition", help="Define your edition name")
+    zipParser.add_argument('--legacy', '-l', action='store_true', help="Name the zip for legacy models")
+    zipParser.add_argument('--programmer', '-p', action='store_true', help="Name the zip and pick the icon for programmer art")
+    zipParser.add_argument('--compression', choices=["fast", "max"], default="max", help="fast: store PNGs and compress the rest quickly, max: compress everything as small as possible (default)")
+    zipParser.add_argument('--manifest', action='store_true', help="Write a manifest with the size and hash of every file next to the zip")
+    zipParser.add_argument('--delta', metavar="ZIP", help="Compare the zip with the zip of a previous release and write a delta zip with the added and changed files, as well as the manifest")
+
+    inspectParser = commands.add_parser("inspect", help="Print the files generated for block or texture IDs and the input files they depend on, without building the pack")
+    inspectParser.add_argument('ids', nargs="+", metavar="ID", help="Block IDs (e.g. minecraft:oak_leaves) or texture IDs (e.g. minecraft:block/oak_leaves). Input textures also list the leaves they're stitched into")
+    inspectParser.add_argument('--legacy', '-l', action='store_true', help="Use legacy models (from 8.1) for all leaves")
+    inspectParser.add_argument('--programmer', '-p', action='store_true', help="Use programmer art textures")
+
+    verifyParser = commands.add_parser("verify", help="Check zips against their manifests, without extracting them")
+    verifyParser.add_argument('zips', nargs="+", metavar="ZIP")
+    verifyParser.add_argument('--manifest', help="Manifest to check against (default: the one next to the zip)")
+    verifyParser.add_argument('--quick', action='store_true', help="Only compare the sizes and checksums stored in the zip's directory, without reading the files")
+    return parser
+
+def parseArgs(argv=None):
+    # Arguments without a command are those of build, as before there were commands
+    argv = sys.argv[1:] if argv == None else list(argv)
+    if len(argv) == 0 or argv[0] not in COMMANDS + ("-h", "--help"): argv = ["build"] + argv
+    return createParser().parse_args(argv)
+
+def loadOverrides():
+    with open('./input/overrides.json') as f:
+        return json.load(f)
+
+def zipName(args):
+    # Named like the same edition built with --editions, so e.g. -p -l doesn't overwrite the zip of -p
+    return Edition.fromArgs(args).zipName(args.version)
+
+def previousZips(specs, edition=None):
+    # Edition name -> zip of the previous release. Without an edition, the zips must name the one they belong to.
+    previous = {}
+    for spec in specs if specs != None else []:
+        name, _, path = spec.partition("=")
+        if name in Edition.NAMES and path != "": previous[name] = path
+        elif edition != None: previous[edition] = spec
+        else: raise SystemExit(f"--delta needs the edition the zip belongs to when building several editions, e.g. \"regular={spec}\"")
+    return previous
+
+def publish(filename, files, args, profiler, previous=None):
+    # Writes the manifest of the zip and its delta to the previous release, if requested
+    if not args.manifest and previous == None: return
+    from src.delta_utils import publishZip
+    with profiler.stage("publishZip"): printDelta(filename, publishZip(filename, files, previous, args.compression, profiler))
+
+def printDelta(filename, delta):
+    if delta == None: return
+    from src.delta_utils import deltaPath
+    print(f"{deltaPath(filename)}: {len(delta['added'])} added, {len(delta['changed'])} changed and {len(delta['removed'])} removed since {delta['from']}")
+
+def build(args, profiler):
+    from src.generator import autoGen
+    from src.output_utils import AssetFolder, AssetTree, MemoryBudget
+    from src.zip_utils import makeZip
+
+    if args.download != None:
+        from src.download_helper import downloadPacks
+        with profiler.stage("download"): downloadPacks(args.download)
 
     # Loads overrides from the json file
-    f = open('./input/overrides.json')
-    data = json.load(f)
-    f.close()
+    data = loadOverrides()
+
+    budget = MemoryBudget(args.memory_budget)
+    output = AssetTree(profiler, budget=budget) if args.in_memory else AssetFolder(profiler=profiler, budget=budget)
+    if args.watch:
+        if args.editions != None: raise SystemExit("--watch builds a single edition, it can't be combined with --editions")
+        from src.watch import WatchSession
+        writeMetadata(args)
+        try: WatchSession(args, output, lambda: makeZip(zipName(args), output, args.programmer, compression=args.compression)).watch()
+        except KeyboardInterrupt: pass
+    elif args.editions != None:
+        from src.build_api import BuildConfig, BuildOptions, build as buildEditions
+        result = buildEditions(BuildConfig(args.version, args.editions, options=BuildOptions.fromArgs(args), output=output, zipFolder=".", profiler=profiler, manifest=args.manifest, previous=previousZips(args.delta)))
+        for filename, delta in result.deltas.items(): printDelta(filename, delta)
+    else:
+        with profiler.stage("autoGen"): autoGen(data, args, output);
+        writeMetadata(args)
+        print()
+        print("Zipping it up...")
+        with profiler.stage("makeZip"): files = makeZip(zipName(args), output, args.programmer, compression=args.compression);
+        edition = Edition.fromArgs(args).name
+        publish(zipName(args), files, args, profiler, previousZips(args.delta, edition).get(edition))
+
+def download(args, profiler):
+    from src.download_helper import downloadPacks
+    with profiler.stage("download"): downloadPacks(args.sources, args.jobs)
 
-    autoGen(data, args);
+def zipAssets(args, profiler):
+    from src.output_utils import AssetFolder
+    from src.zip_utils import makeZip
     writeMetadata(args)
-    print()
     print("Zipping it up...")
-    makeZip(f"Better-Leaves-{args.version}.zip" if not args.programmer else f"Better-Leaves-(Programmer-Art)-{args.version}.zip", args.programmer);
+    with profiler.stage("makeZip"): files = makeZip(zipName(args), AssetFolder(profiler=profiler), args.programmer, compression=args.compression)
+    publish(zipName(args), files, args, profiler, args.delta)
+
+def inspect(args, profiler):
+    from src.generator import explain
+    explain(loadOverrides(), args, args.ids)
+
+def verify(args, profiler):
+    from src.delta_utils import verifyZip
+    failed = 0
+    for filename in args.zips:
+        with profiler.stage("verifyZip", zip=filename): problems = verifyZip(filename, args.manifest, args.quick)
+        for problem in problems: print(f"{filename}: {problem}")
+        print(f"{filename}: {'OK' if len(problems) == 0 else f'{len(problems)} problem(s)'}")
+        failed += len(problems) > 0
+    if failed > 0: raise SystemExit(f"{failed} zip(s) don't match their manifest")
+
+# This is the main entry point, executed when the script is run
+if __name__ == '__main__':
+    start_time = time.perf_counter()
+    args = parseArgs()
+
+    print(f"Arguments: {args}")
+    print()
+    print("Motschen's Better Leaves Lite")
+    print("https://github.com/TeamMidnightDust/BetterLeavesLite")
+    print()
+    from src.profiler import Profiler
+    profiler = Profiler(getattr(args, "profile", None) != None)
+    {"build": build, "download": download, "zip": zipAssets, "inspect": inspect, "verify": verify}[args.command](args, profiler)
     print("Done!")
+    if profiler.enabled:
+        profiler.writeTrace(args.profile)
+        profiler.printSummary()
+        print(f"Profile written to {args.profile}")
     print("--- Finished in %s seconds ---" % (round((time.perf_counter() - start_time)*1000)/1000))
@@ -0,0 +1,87 @@
+import io
+import os
+import re
+import threading
+import zipfile
+
+# Texturepacks and mods are read in place, without extracting them first.
+# Files inside of an archive are addressed as if the archive was a folder,
+# e.g. "./input/texturepacks/pack.zip/assets/minecraft/textures/block/oak_leaves.png".
+archivePath = re.compile(r"^(.*?\.(?:zip|jar))/(.*)$")
+
+archives = {} # Opened archives of the current process, by path -> (archive, state of the file when it was opened)
+archivesPid = None
+archivesLock = threading.Lock()
+
+def fileState(path):
+    # Changes whenever the file is replaced or edited, used to tell whether cached contents are outdated
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+def openArchive(path) -> zipfile.ZipFile:
+    global archives, archivesPid
+    state = fileState(path)
+    with archivesLock:
+        # Worker processes must not share the file handles (and offsets) of their parent
+        if archivesPid != os.getpid():
+            archives = {}
+            archivesPid = os.getpid()
+        if path in archives and archives[path][1] == state: return archives[path][0]
+    # Reading the central directory happens outside of the lock, so several archives can be opened at once
+    archive = zipfile.ZipFile(path, 'r')
+    with archivesLock:
+        if path in archives and archives[path][1] == state: # Opened by another thread in the meantime
+            archive.close()
+            return archives[path][0]
+        # A replaced archive is opened again. The old one isn't closed, another build may still be reading it,
+        # it's closed once nothing uses it anymore.
+        archives[path] = (archive, state)
+        return archive
+
+def closeArchives():
+    # Archives are opened again the next time they're read, e.g. after they changed on disk
+    with archivesLock:
+        for archive, state in archives.values(): archive.close()
+        archives.clear()
+
+def assetPath(root):
+    # Location of a folder relative to its assets folder, e.g. "minecraft/textures/block"
+    # for both "./input/assets/minecraft/textures/block" and "./input/mods/mod.jar/assets/minecraft/textures/block"
+    # The last assets folder, the root folder of the build may be inside of another one
+    return root.rsplit("/assets/", 1)[1] if "/assets/" in root else ""
+
+def splitArchivePath(path):
+    match = archivePath.match(path)
+    if match == None or not os.path.isfile(match.group(1)): return None, path
+    return match.group(1), os.path.normpath(match.group(2)).replace(os.sep, "/")
+
+def assetState(path):
+    # State of the file, or of the archive it's in
+    archive, member = splitArchivePath(path)
+    return fileState(archive if archive != None else path)
+
+def readAsset(path) -> bytes:
+    archive, member = splitArchivePath(path)
+    if archive == None:
+        with open(path, "rb") as f: return f.read()
+    return openArchive(archive).read(member)
+
+def readAssetHeader(path, size) -> bytes:
+    # Only reads (and for archives, decompresses) the beginning of the file
+    archive, member = splitArchivePath(path)
+    if archive == None:
+        with open(path, "rb") as f: return f.read(size)
+    with openArchive(archive).open(member) as f: return f.read(size)
+
+def assetExists(path):
+    archive, member = splitArchivePath(path)
+    if archive == None: return os.path.isfile(path)
+    return member in openArchive(archive).NameToInfo
+
+def openAsset(path):
+    archive, member = splitArchivePath(path)
+    if archive == None: return open(path, "rb")
+    return io.BytesIO(openArchive(archive).read(member))
+
+def listArchive(path):
+    return openArchive(path).namelist()
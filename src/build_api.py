@@ -0,0 +1,86 @@
+# Depencency imports
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Local imports
+from src.data.edition import Edition
+from src.data.workspace import Workspace
+from src.generator import generateEditions
+from src.output_utils import AssetTree, MemoryBudget
+from src.profiler import Profiler
+from src.zip_utils import createMetadata, makeZip
+from src.delta_utils import publishZip
+
+# Builds the pack from Python, without going through the command line.
+# Everything a build needs is passed in, so several builds (e.g. of different workspaces or editions) can run
+# at the same time on different threads of one process. They share the caches of decoded masks, texture sizes,
+# texturepack indexes and opened archives. These are keyed by the state of the files (modification time and size),
+# so later builds of a long running process see the files as they are now.
+
+class BuildOptions:
+    # The same options as the build command, with the same defaults
+    def __init__(self, legacy=False, programmer=False, minify=False, no_cache=False, numpy=False, optimize_png=False, dedupe_textures=False, jobs=1, compression="max", edition="§cCustom Edition", memory_budget=None):
+        self.legacy = legacy
+        self.programmer = programmer
+        self.minify = minify
+        self.no_cache = no_cache
+        self.numpy = numpy
+        self.optimize_png = optimize_png
+        self.dedupe_textures = dedupe_textures
+        self.jobs = jobs
+        self.compression = compression
+        self.edition = edition # Display name of editions that don't have their own
+        self.memory_budget = memory_budget # In MB, used by the default output
+
+    @classmethod
+    def fromArgs(cls, args):
+        return cls(args.legacy, args.programmer, args.minify, args.no_cache, args.numpy, args.optimize_png, args.dedupe_textures, args.jobs, args.compression, args.edition, args.memory_budget)
+
+class BuildConfig:
+    def __init__(self, version, editions=None, root=".", options=None, output=None, zipFolder=None, profiler=None, manifest=False, previous=None):
+        self.version = version
+        self.editions = editions # Edition specs like "programmer=§7Programmer Edition", by default the one given by the options
+        self.workspace = Workspace(root) # Where the input files are read from
+        self.options = options if options != None else BuildOptions()
+        self.profiler = profiler if profiler != None else Profiler()
+        self.output = output if output != None else AssetTree(self.profiler, budget=MemoryBudget(self.options.memory_budget)) # Output of the first edition, e.g. AssetFolder(root)
+        self.zipFolder = zipFolder # Where the zips are written, None to skip zipping
+        self.manifest = manifest # Whether to write a manifest next to every zip
+        self.previous = previous if previous != None else {} # Edition name -> zip of the previous release, to write a delta zip for
+
+class BuildResult:
+    def __init__(self, editions, zips, leaves, seconds, deltas=None):
+        self.editions = editions # The built editions, with their generated assets in edition.output
+        self.zips = zips # Paths of the written zips
+        self.deltas = deltas if deltas != None else {} # Zip path -> files added, changed and removed since the previous release
+        self.leaves = leaves
+        self.seconds = seconds
+
+def build(config) -> BuildResult:
+    start = time.perf_counter()
+    options, workspace, profiler = config.options, config.workspace, config.profiler
+    with open(workspace.overrides) as f: jsonData = json.load(f)
+
+    # Editions are created for every build, they hold its output
+    editions = [Edition.fromSpec(spec, options.edition) for spec in config.editions] if config.editions != None else [Edition.fromArgs(options)]
+    with profiler.stage("generateEditions"): leaves = generateEditions(jsonData, options, editions, config.output, workspace)
+
+    zips, deltas = [], {}
+    if config.zipFolder != None:
+        print()
+        print("Zipping them up...")
+        zips = [os.path.join(config.zipFolder, edition.zipName(config.version)) for edition in editions]
+        # The zips are written at the same time, zlib compression doesn't hold the GIL
+        with profiler.stage("makeZip"), ThreadPoolExecutor(len(editions)) as executor:
+            for path, future in [(path, executor.submit(zipEdition, config, edition, path)) for path, edition in zip(zips, editions)]:
+                delta = future.result()
+                if delta != None: deltas[path] = delta
+    return BuildResult(editions, zips, leaves, time.perf_counter() - start, deltas)
+
+def zipEdition(config, edition, path):
+    options, workspace = config.options, config.workspace
+    files = makeZip(path, edition.output, edition.programmer, createMetadata(config.version, edition.display_name, workspace.packMetadata), options.compression, workspace.root)
+    if config.manifest or edition.name in config.previous:
+        return publishZip(path, files, config.previous.get(edition.name), options.compression, config.profiler)
@@ -0,0 +1,58 @@
+import hashlib
+import os
+import threading
+import time
+import PIL
+
+from src.archive_utils import readAsset
+
+# Bump this whenever the texture generation changes, so outdated textures aren't reused
+CACHE_VERSION = 1
+# File timestamps can lag behind the clock a little, files stored this shortly before a build started count as its own
+TIMESTAMP_SLACK_NS = 2_000_000_000
+
+class BuildCache:
+    # Persistent cache for generated textures, stored in ".buildcache/<edition>/".
+    # Textures are looked up by a hash of everything they are generated from:
+    # the (texturepack-overridden) source texture, stitched neighbour textures, the mask and the generator version.
+    def __init__(self, edition="regular", cacheFolder="./.buildcache"):
+        self.folder = os.path.join(cacheFolder, edition)
+        self.started = time.time_ns()
+        os.makedirs(self.folder, exist_ok=True)
+
+    def key(self, files, extra=()):
+        sha = hashlib.sha256(f"{CACHE_VERSION};{PIL.__version__}".encode())
+        for entry in extra: sha.update(f";{entry}".encode())
+        for file in files: sha.update(hashlib.sha256(readAsset(file)).digest())
+        return sha.hexdigest()
+
+    def restore(self, key) -> bytes:
+        cached = os.path.join(self.folder, key + ".png")
+        # Another build of the same edition (running at the same time) may prune it at any moment
+        try:
+            with open(cached, "rb") as f: return f.read()
+        except FileNotFoundError:
+            return None
+
+    def store(self, key, data):
+        # Write to a temporary file first, as other worker processes (or writer threads) might store the same texture
+        cached = os.path.join(self.folder, key + ".png")
+        temp = f"{cached}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp, "wb") as f: f.write(data)
+        os.replace(temp, cached)
+
+    def prune(self, usedKeys):
+        # Removes textures of leaves that no longer exist or have changed since the last build.
+        # Other builds of the same edition may use the folder at the same time (threads of the build API, other processes):
+        # files that are still being written and textures stored since this build started are theirs, so they're kept.
+        # Temporary files are only removed once they're old, i.e. left behind by a build that was interrupted.
+        removed = 0
+        for infile in os.listdir(self.folder):
+            if infile.removesuffix(".png") in usedKeys: continue
+            try:
+                if os.stat(os.path.join(self.folder, infile)).st_mtime_ns >= self.started - TIMESTAMP_SLACK_NS: continue
+                os.remove(os.path.join(self.folder, infile))
+                removed += 1
+            except FileNotFoundError: # Pruned by another build
+                pass
+        return removed
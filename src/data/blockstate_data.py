@@ -1,6 +1,7 @@
 import os
 import json
 
+from src.archive_utils import readAsset
 from src.data.leafblock import LeafBlock
 from src.utilities import printOverride
 
@@ -16,6 +17,5 @@ class BlockStateData:
 
     @classmethod
     def fromFile(cls, leaf: LeafBlock, root, infile):
-        with open(os.path.join(root, infile), "r") as f:
-            printOverride("Loading blockstate data from: "+f.name)
-            return BlockStateData.fromJson(leaf, json.load(f).get("blockStateData"))
+        printOverride("Loading blockstate data from: "+os.path.join(root, infile))
+        return BlockStateData.fromJson(leaf, json.loads(readAsset(os.path.join(root, infile))).get("blockStateData"))
@@ -0,0 +1,28 @@
+class Edition:
+    # A variant of the pack, e.g. with programmer art textures or legacy models
+    NAMES = ("regular", "programmer", "legacy", "programmer-legacy")
+
+    def __init__(self, name, display_name):
+        if name not in Edition.NAMES: raise ValueError(f"Unknown edition '{name}', choose from: {', '.join(Edition.NAMES)}")
+        self.name = name
+        self.display_name = display_name
+        self.programmer = name.startswith("programmer")
+        self.legacy = name.endswith("legacy")
+        self.output = None # Set once the assets are generated
+
+    @classmethod
+    def fromArgs(cls, args):
+        name = "-".join(flag for flag, enabled in (("programmer", args.programmer), ("legacy", args.legacy)) if enabled)
+        return cls(name if name else "regular", displayName(args.edition))
+
+    @classmethod
+    def fromSpec(cls, spec, default_display_name):
+        # Either just the edition ("programmer") or the edition with a display name ("programmer=§7Programmer Edition")
+        name, _, display_name = spec.partition("=")
+        return cls(name, display_name if display_name else displayName(default_display_name))
+
+    def zipName(self, version):
+        return f"Better-Leaves-{'(Programmer-Art)-' if self.programmer else ''}{'(Legacy)-' if self.legacy else ''}{version}.zip"
+
+def displayName(edition):
+    return " ".join(edition) if isinstance(edition, list) else edition
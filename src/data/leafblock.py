@@ -1,27 +1,51 @@
 class LeafBlock:
-    def __init__(self, namespace, block_name, texture_name):
+    __slots__ = ("namespace", "block_name", "texture_name", "root", "infile", "base_model", "has_no_tint", "has_texture_override",
+                 "should_generate_item_model", "use_legacy_model", "should_generate_texture", "skipped", "texture_prefix",
+                 "overlay_texture_id", "block_id_override", "texture_id_override", "dynamictrees_namespace", "blockstate_data",
+                 "sprite_overrides", "carpet_ids", "block_state_copies", "id", "id_namespace", "id_name", "texture_id")
+
+    def __init__(self, namespace, block_name, texture_name, root=None, infile=None):
         self.namespace = namespace
         self.block_name = block_name
         self.texture_name = texture_name
+        self.root = root # Location of the input texture
+        self.infile = infile
+
+        self.base_model = "leaves"
+        self.has_no_tint = False
+        self.has_texture_override = False
+        self.should_generate_item_model = False
+        self.use_legacy_model = False
+        self.should_generate_texture = False
+        self.skipped = False
+        self.texture_prefix = ""
+        self.overlay_texture_id = ""
+        self.block_id_override = None
+        self.texture_id_override = None
+        self.dynamictrees_namespace = None
+        self.blockstate_data = None
+        self.sprite_overrides = None
+        self.carpet_ids = ()
+        self.block_state_copies = ()
 
-    base_model = "leaves"
-    has_carpet = False
-    has_no_tint = False
-    has_texture_override = False
-    should_generate_item_model = False
-    use_legacy_model = False
-    texture_prefix = ""
-    overlay_texture_id = ""
-    block_id_override = None
-    texture_id_override = None
-    dynamictrees_namespace = None
-    blockstate_data = None
-    sprite_overrides = None
+        # Set by freeze(), once all overrides are applied
+        self.id = None
+        self.id_namespace = None
+        self.id_name = None
+        self.texture_id = None
 
     def getId(self):
+        if (self.id != None): return self.id
         if (self.block_id_override != None): return self.block_id_override
         return self.namespace+":"+self.block_name
 
     def getTextureId(self):
+        if (self.texture_id != None): return self.texture_id
         if (self.texture_id_override != None): return self.texture_id_override
         return self.namespace+":block/"+self.texture_prefix+self.texture_name
+
+    def freeze(self):
+        # Resolves the IDs once, so they don't have to be rebuilt by every generator
+        self.id = self.getId()
+        self.id_namespace, self.id_name = self.id.split(":")
+        self.texture_id = self.getTextureId()
@@ -0,0 +1,68 @@
+# Sections of overrides.json, and the type each of them must have
+SECTIONS = {
+    "noTint": list,
+    "leavesWithCarpet": dict,
+    "blockTextures": dict,
+    "overlayTextures": dict,
+    "overlayVariants": dict,
+    "blockIds": dict,
+    "dynamicTreesNamespaces": dict,
+    "generateItemModels": list,
+    "blockStateCopies": dict,
+    "compileOnly": list
+}
+
+class Overrides:
+    # overrides.json, compiled once into sets and dicts keyed by ID, instead of being looked through for every leaf
+    __slots__ = ("no_tint", "leaves_with_carpet", "block_textures", "overlay_textures", "overlay_texture_ids", "overlay_variants",
+                 "block_ids", "dynamictrees_namespaces", "generate_item_models", "block_state_copies", "compile_only")
+
+    def __init__(self, jsonData):
+        validate(jsonData)
+        self.no_tint = frozenset(jsonData["noTint"])
+        self.leaves_with_carpet = {leaf_id: toList(carpet_ids) for leaf_id, carpet_ids in jsonData["leavesWithCarpet"].items()}
+        self.block_textures = dict(jsonData["blockTextures"])
+        self.overlay_textures = dict(jsonData["overlayTextures"])
+        self.overlay_texture_ids = frozenset(self.overlay_textures.values())
+        self.overlay_variants = dict(jsonData["overlayVariants"])
+        self.block_ids = dict(jsonData["blockIds"])
+        self.dynamictrees_namespaces = dict(jsonData["dynamicTreesNamespaces"])
+        self.generate_item_models = frozenset(jsonData["generateItemModels"])
+        self.block_state_copies = {leaf_id: toList(copy_ids) for leaf_id, copy_ids in jsonData["blockStateCopies"].items()}
+        self.compile_only = frozenset(jsonData["compileOnly"])
+
+    def findUnknownIds(self, leaves):
+        # Returns the entries that don't match any of the given leaves, e.g. because of a typo or a renamed texture
+        block_ids = {leaf.namespace+":"+leaf.block_name for leaf in leaves} | {leaf.getId() for leaf in leaves}
+        texture_ids = {leaf.namespace+":block/"+leaf.texture_prefix+leaf.texture_name for leaf in leaves}
+        namespaces = {leaf.namespace for leaf in leaves}
+        unknown = []
+        for section, ids, known in (
+                ("noTint", self.no_tint, block_ids),
+                ("leavesWithCarpet", self.leaves_with_carpet, block_ids),
+                ("blockTextures", self.block_textures, block_ids),
+                ("overlayTextures", self.overlay_textures, block_ids),
+                ("overlayTextures", self.overlay_texture_ids, texture_ids),
+                ("overlayVariants", self.overlay_variants, block_ids),
+                ("blockIds", self.block_ids, block_ids),
+                ("dynamicTreesNamespaces", self.dynamictrees_namespaces, namespaces),
+                ("generateItemModels", self.generate_item_models, block_ids),
+                ("blockStateCopies", self.block_state_copies, block_ids),
+                ("compileOnly", self.compile_only, texture_ids)):
+            unknown += [(section, entry) for entry in sorted(ids) if entry not in known]
+        return unknown
+
+def toList(ids):
+    # In case only one ID is provided (as a string), turn it into a list
+    return ids if isinstance(ids, list) else [ids]
+
+def validate(jsonData):
+    problems = []
+    for section, sectionType in SECTIONS.items():
+        if section not in jsonData: problems.append(f"Missing section '{section}'")
+        elif not isinstance(jsonData[section], sectionType): problems.append(f"Section '{section}' must be a {'list' if sectionType == list else 'dictionary'}")
+        else:
+            entries = jsonData[section] if sectionType == list else list(jsonData[section].keys()) + [value for values in jsonData[section].values() for value in toList(values)]
+            if section == "dynamicTreesNamespaces": continue # Namespaces, not IDs
+            problems += [f"Invalid ID in '{section}': {entry}" for entry in entries if not isinstance(entry, str) or entry.count(":") != 1]
+    if problems: raise ValueError("Invalid overrides.json:\n" + "\n".join(problems))
@@ -0,0 +1,20 @@
+import os
+
+class Workspace:
+    # Locations of the files a build reads, inside of a root folder (by default the working directory).
+    # Builds of different workspaces can run in the same process.
+    def __init__(self, root="."):
+        self.root = root
+        self.assets = os.path.join(root, "input/assets")
+        self.masks = os.path.join(root, "input/masks")
+        self.mods = os.path.join(root, "input/mods")
+        self.texturepacks = os.path.join(root, "input/texturepacks")
+        self.programmerArt = os.path.join(root, "input/programmer_art")
+        self.overrides = os.path.join(root, "input/overrides.json")
+        self.packMetadata = os.path.join(root, "input/pack.mcmeta")
+        self.base = os.path.join(root, "base/assets/")
+        self.buildCache = os.path.join(root, ".buildcache")
+
+    def path(self, path):
+        # Other files of the pack, e.g. "pack.png"
+        return os.path.join(self.root, path)
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Local imports
+from src.zip_utils import writeEntries
+
+# Releases can be shipped as the changes since the previous release: a delta zip with the added and changed files
+# and a list of the removed ones. Files are compared by their content hash, which the manifest of a zip lists
+# for every entry, next to its size and CRC. The manifest also allows checking a zip without extracting it.
+DELTA_INFO = "delta.json"
+CHUNK_SIZE = 1024 * 1024
+
+def manifestPath(zipPath):
+    return zipPath.removesuffix(".zip") + ".manifest.json"
+
+def deltaPath(zipPath):
+    return zipPath.removesuffix(".zip") + ".delta.zip"
+
+def writeManifest(zipPath, files):
+    with open(manifestPath(zipPath), "w") as f: json.dump({"zip": os.path.basename(zipPath), "files": files}, f, indent=4)
+
+def readManifest(path):
+    with open(path) as f: return json.load(f)["files"]
+
+def hashEntry(zipf, info):
+    # Streams the entry instead of reading it at once, reading it to the end also checks its CRC
+    sha = hashlib.sha256()
+    with zipf.open(info) as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""): sha.update(chunk)
+    return sha.hexdigest()
+
+def hashZip(zipPath):
+    # Uses the manifest written along with the zip, if there is one and it matches the zip's directory
+    with zipfile.ZipFile(zipPath) as zipf:
+        infos = [info for info in zipf.infolist() if not info.is_dir()]
+        if os.path.isfile(manifestPath(zipPath)):
+            try: files = readManifest(manifestPath(zipPath))
+            except (ValueError, KeyError, TypeError): files = None
+            if manifestMatches(files, infos): return files
+            print(f"The manifest of '{zipPath}' doesn't match it, hashing the zip instead")
+        with ThreadPoolExecutor() as executor:
+            return {info.filename: {"size": info.file_size, "crc32": info.CRC, "sha256": digest} for info, digest in zip(infos, executor.map(lambda info: hashEntry(zipf, info), infos))}
+
+def manifestMatches(files, infos):
+    # A manifest left over from another zip (e.g. one that was rebuilt without it) lists other entries, sizes or CRCs
+    try: return files.keys() == {info.filename for info in infos} and all(matchesEntry(files[info.filename], info) for info in infos)
+    except (AttributeError, KeyError, TypeError): return False
+
+def matchesEntry(entry, info):
+    return (entry["size"], entry["crc32"]) == (info.file_size, info.CRC) and isinstance(entry["sha256"], str)
+
+def compareManifests(previous, current):
+    added = sorted(name for name in current if name not in previous)
+    changed = sorted(name for name in current if name in previous and previous[name]["sha256"] != current[name]["sha256"])
+    removed = sorted(name for name in previous if name not in current)
+    return added, changed, removed
+
+def makeDelta(zipPath, files, previousZip, compression="max", profiler=None):
+    # Writes the files of the zip that were added or changed since the previous zip into a delta zip,
+    # along with a list of all changes. Returns the list.
+    added, changed, removed = compareManifests(hashZip(previousZip), files)
+    info = {"from": os.path.basename(previousZip), "to": os.path.basename(zipPath), "added": added, "changed": changed, "removed": removed}
+    with zipfile.ZipFile(zipPath) as zipf: entries = {name: zipf.read(name) for name in added + changed}
+    entries[DELTA_INFO] = json.dumps(info, indent=4).encode()
+    writeEntries(deltaPath(zipPath), entries, compression, profiler)
+    return info
+
+def verifyZip(zipPath, manifest=None, quick=False):
+    # Checks a zip against its manifest without extracting it. Returns the problems that were found.
+    # quick only compares the sizes and CRCs of the zip's directory, without reading the entries.
+    files = readManifest(manifest if manifest != None else manifestPath(zipPath))
+    problems = []
+    with zipfile.ZipFile(zipPath) as zipf:
+        infos = {info.filename: info for info in zipf.infolist() if not info.is_dir()}
+        problems += [f"missing: {name}" for name in sorted(files.keys() - infos.keys())]
+        problems += [f"unexpected: {name}" for name in sorted(infos.keys() - files.keys())]
+        listed = [infos[name] for name in sorted(files.keys() & infos.keys())]
+        mismatched = {info.filename for info in listed if (info.file_size, info.CRC) != (files[info.filename]["size"], files[info.filename]["crc32"])}
+        if not quick:
+            with ThreadPoolExecutor() as executor:
+                for info, digest in zip(listed, executor.map(lambda info: safeHash(zipf, info), listed)):
+                    if digest != files[info.filename]["sha256"]: mismatched.add(info.filename)
+        problems += [f"changed: {name}" for name in sorted(mismatched)]
+    return problems
+
+def safeHash(zipf, info):
+    # A corrupted entry doesn't match, instead of stopping the check
+    try: return hashEntry(zipf, info)
+    except (zipfile.BadZipFile, zlib.error, EOFError): return None
+
+def publishZip(zipPath, files, previousZip=None, compression="max", profiler=None):
+    # Writes the manifest of a freshly built zip, and its delta if there is a previous release.
+    # Returns the list of changes, or None without a previous release.
+    writeManifest(zipPath, files)
+    return makeDelta(zipPath, files, previousZip, compression, profiler) if previousZip != None else None
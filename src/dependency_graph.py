@@ -0,0 +1,72 @@
+import contextlib
+import io
+import os
+
+# Local imports
+from src.archive_utils import assetExists
+from src.texture_generator import betterleavesJsonRoot, chooseMask, createTextureMap, textureOutfile
+from src.texture_info import getTextureInfo
+from src.texturepack_utils import scanPacksForTexture
+from src.data.workspace import Workspace
+
+class DependencyGraph:
+    # Maps every generated file to the input files it's made from (textures, sidecar files, masks,
+    # texturepack overrides and overrides.json), and every input file back to the leaves that use it.
+    # Inputs only ever lead to generated files (stitching uses the input textures, not generated ones),
+    # so all leaves of a build are independent and a change only affects the leaves that use the changed file.
+    def __init__(self):
+        self.leafFiles = {} # (root, infile) of a leaf -> {generated file: input files}
+        self.dependents = {} # Input file -> leaves that use it
+
+    def addLeaf(self, key, files):
+        self.removeLeaf(key)
+        self.leafFiles[key] = files
+        for inputs in files.values():
+            for path in inputs: self.dependents.setdefault(path, set()).add(key)
+
+    def removeLeaf(self, key):
+        for inputs in self.leafFiles.pop(key, {}).values():
+            for path in inputs: self.dependents.get(path, set()).discard(key)
+
+    def affectedLeaves(self, changed):
+        return set().union(*(self.dependents.get(os.path.normpath(path), ()) for path in changed))
+
+    def inputsOf(self, generated):
+        # A blockstate can be written by several leaves
+        return set().union(*(files.get(generated, ()) for files in self.leafFiles.values()))
+
+class PathRecorder:
+    # Stands in for the output to find out which files a leaf writes
+    def __init__(self):
+        self.paths = []
+
+    def exists(self, path):
+        return False
+
+    def writeJson(self, path, data):
+        self.paths.append(os.path.normpath(path))
+
+def textureInputs(leaf, packIndexes, workspace=Workspace()):
+    # The same files generateTextureFile reads: the texture (possibly from a texturepack), its stitching neighbours,
+    # the mask and the stitching data
+    with contextlib.redirect_stdout(io.StringIO()):
+        textureMap = createTextureMap(leaf.root, leaf.infile, packIndexes, assetsFolder=workspace.assets)
+        root = leaf.root
+        for packIndex in packIndexes: root = scanPacksForTexture(root, leaf.infile, packIndex)
+    mask = chooseMask(leaf.infile, getTextureInfo(os.path.join(root, leaf.infile)).width, workspace.masks)
+    return normalize([os.path.join(root, leaf.infile), mask] + list(textureMap.values()) + sidecarFiles(leaf, workspace))
+
+def sidecarFiles(leaf, workspace=Workspace()):
+    jsonRoot = betterleavesJsonRoot(leaf.root, leaf.infile, workspace.assets)
+    sidecars = [os.path.join(jsonRoot, leaf.infile.replace(".png", ".betterleaves.json")), os.path.join(leaf.root, leaf.infile + ".mcmeta")]
+    return [sidecar for sidecar in sidecars if assetExists(sidecar)]
+
+def normalize(paths):
+    return {os.path.normpath(path) for path in paths}
+
+def leafFiles(leaf, jsonFiles, packIndexes, workspace=Workspace()):
+    # Blockstates and models depend on overrides.json, the stitching data and the texture's size (animated textures use the legacy model)
+    jsonInputs = normalize([workspace.overrides, os.path.join(leaf.root, leaf.infile)] + sidecarFiles(leaf, workspace))
+    files = {path: jsonInputs for path in jsonFiles}
+    if leaf.should_generate_texture: files[textureOutfile(leaf.root, leaf.infile)] = textureInputs(leaf, packIndexes, workspace) | normalize([workspace.overrides])
+    return files
@@ -1,36 +1,111 @@
-from os import path
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
-import requests
+import hashlib
+import json
+import os
 import re
+import requests
+import shutil
+import threading
+
+# Can be pointed to a mirror or a local stand-in server
+MODRINTH_API = os.environ.get("MODRINTH_API", "https://api.modrinth.com/v2")
+CHUNK_SIZE = 1024 * 1024
+
+class DownloadCache:
+    # Downloaded packs are stored by their SHA-512 hash, so every version is only downloaded once.
+    # The index remembers what each slug or URL resolved to last, so builds can reuse it without network access.
+    def __init__(self, cacheFolder="./.buildcache/downloads"):
+        self.folder = cacheFolder
+        self.lock = threading.Lock()
+        self.index = {}
+        if os.path.isfile(os.path.join(cacheFolder, "index.json")):
+            with open(os.path.join(cacheFolder, "index.json")) as f: self.index = json.load(f)
+
+    def path(self, sha512):
+        return os.path.join(self.folder, sha512[:2], sha512)
+
+    def contains(self, sha512):
+        return sha512 != None and os.path.isfile(self.path(sha512))
 
-def downloadPack(input: str):
-    if re.search("(http://*)|(https://*)", input) != None and input.endswith(".zip"):
-        downloadZip(input)
+    def remember(self, source, entry):
+        with self.lock:
+            self.index[source] = entry
+            os.makedirs(self.folder, exist_ok=True)
+            with open(os.path.join(self.folder, "index.json"), "w") as f: json.dump(self.index, f, indent=4)
+
+def downloadPacks(sources, jobs=8):
+    # Slugs and URLs are resolved and downloaded at the same time, over a single connection pool
+    cache = DownloadCache()
+    with requests.Session() as session, ThreadPoolExecutor(max(1, min(jobs, len(sources)))) as executor:
+        session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=jobs))
+        session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=jobs))
+        session.headers["User-Agent"] = "Motschen/Better-Leaves-Lite (resourcepack generator)"
+        for future in [executor.submit(downloadPack, source, session, cache, position) for position, source in enumerate(sources)]:
+            future.result()
+
+def downloadPack(input: str, session=None, cache=None, position=0):
+    if session == None: session = requests.Session()
+    if cache == None: cache = DownloadCache()
+    # Only Modrinth publishes the hash of a file. The hash remembered for a plain URL is just the one of the last download,
+    # the file behind the URL may have changed since then.
+    isUrl = re.search("(http://*)|(https://*)", input) != None and input.endswith(".zip")
+    if isUrl:
+        entry = cache.index.get(input, {"url": input, "filename": input.split("/")[-1], "sha512": None})
     else:
-        downloadFromModrinth(input)
+        entry = resolveModrinth(input, session, cache)
+
+    if cache.contains(entry["sha512"]): print(f'Using cached texturepack: {input} ({entry["filename"]})')
+    else: entry["sha512"] = downloadZip(entry["url"], cache, session, None if isUrl else entry["sha512"], file_name=entry["filename"], pack_name=input, position=position)
+    cache.remember(input, entry)
 
-def downloadFromModrinth(project_slug):
-    response = requests.get(f'https://api.modrinth.com/v2/project/{project_slug}/version')
-    latestFile = response.json()[0]['files'][0]
-    latestFileURL = latestFile['url']
-    if len(latestFileURL) < 1: raise Exception(f'Could not get the latest version URL for {project_slug}')
-    downloadZip(latestFileURL, file_name=latestFile['filename'], pack_name=project_slug)
+    # Hard links are free, copies are the fallback (e.g. across drives)
+    location = os.path.join('input/texturepacks', entry["filename"])
+    os.makedirs(os.path.dirname(location), exist_ok=True)
+    if os.path.exists(location): os.remove(location)
+    try: os.link(cache.path(entry["sha512"]), location)
+    except OSError: shutil.copyfile(cache.path(entry["sha512"]), location)
 
-def downloadZip(url, file_name="", pack_name=""):
-    download_stream = requests.get(url, stream=True)
+def resolveModrinth(project_slug, session, cache):
+    try:
+        response = session.get(f'{MODRINTH_API}/project/{project_slug}/version')
+        response.raise_for_status()
+    except requests.RequestException:
+        # Offline or rate limited, fall back to the version we used last time
+        if project_slug in cache.index and cache.contains(cache.index[project_slug]["sha512"]): return cache.index[project_slug]
+        raise
+    latestVersion = response.json()[0]
+    latestFile = latestVersion['files'][0]
+    if len(latestFile['url']) < 1: raise Exception(f'Could not get the latest version URL for {project_slug}')
+    return {"version_id": latestVersion['id'], "url": latestFile['url'], "filename": latestFile['filename'], "sha512": latestFile['hashes'].get('sha512')}
+
+def downloadZip(url, cache, session, sha512=None, file_name="", pack_name="", position=0) -> str:
+    # Downloads into the cache and returns the SHA-512 hash of the file
+    download_stream = session.get(url, stream=True)
+    download_stream.raise_for_status()
     if file_name == "": file_name = url.split("/")[-1]
     if pack_name == "": pack_name = url
-    file_path = 'input/texturepacks'
 
     print(f'Downloading texturepack: {pack_name} (Latest version: {file_name})')
-    location = path.join(file_path, file_name)
+    os.makedirs(cache.folder, exist_ok=True)
+    temp_location = os.path.join(cache.folder, f"{file_name}.{threading.get_ident()}.tmp")
+    hash = hashlib.sha512()
     total = int(download_stream.headers.get('content-length', 0))
-    with open(location, "wb") as handle, tqdm(
+    with open(temp_location, "wb") as handle, tqdm(
             unit="kB",
             desc=file_name,
             total=total,
             unit_scale=True,
-            unit_divisor=1024,) as progressbar:
-        for data in download_stream.iter_content(chunk_size=1024):
+            unit_divisor=1024,
+            position=position) as progressbar:
+        for data in download_stream.iter_content(chunk_size=CHUNK_SIZE):
             size = handle.write(data)
+            hash.update(data)
             progressbar.update(size)
+
+    if sha512 != None and hash.hexdigest() != sha512:
+        os.remove(temp_location)
+        raise Exception(f'Downloaded file for {pack_name} is corrupted (SHA-512 mismatch)')
+    os.makedirs(os.path.dirname(cache.path(hash.hexdigest())), exist_ok=True)
+    os.replace(temp_location, cache.path(hash.hexdigest()))
+    return hash.hexdigest()
@@ -1,64 +1,185 @@
 # Depencency imports
+import contextlib
+import hashlib
+import io
 import os
-import shutil
-from PIL import Image
-from setuptools._distutils.dir_util import copy_tree
 
 # Local imports
 from src.data.leafblock import LeafBlock
 from src.data.carpetblock import CarpetBlock
-from src.mod_utils import unpackMods, cleanupMods, scanModsForTextures
-from src.texturepack_utils import unpackTexturepacks, cleanupTexturepacks
+from src.data.overrides import Overrides
+from src.data.edition import Edition
+from src.mod_utils import scanModsForTextures
+from src.texturepack_utils import TexturepackIndex, loadTexturepackIndex
+from src.archive_utils import assetPath
 from src.utilities import printCyan, printGreen, printOverride
-from src.texture_generator import generateTexture
+from src.parallel_utils import TextureWorkers
+from src.texture_generator import numpyStitching, betterleavesJsonRoot, createTextureMap, textureOutfile
+from src.texture_info import getTextureInfo
+from src.output_utils import AssetTree, AssetOverlay, JsonBuffer
+from src.build_cache import BuildCache
 from src.model_generator import generateBlockModels, generateItemModel
 from src.blockstate_generator import generateBlockstate
 from src.carpet_generator import generateCarpetAssets
-from src.json_utils import minifyJsonFiles, minify
 from src.betterleaves_json import applyJson
+from src.dependency_graph import DependencyGraph, PathRecorder, leafFiles
+from src.profiler import Profiler
+from src.data.workspace import Workspace
 
 # This is where the magic happens
-def autoGen(jsonData, args):
+def autoGen(jsonData, args, output, workspace=Workspace()):
+    return generateEditions(jsonData, args, [Edition.fromArgs(args)], output, workspace)
+
+def generateEditions(jsonData, args, editions, output, workspace=Workspace()) -> int:
+    # Generates several editions at once. Editions that only differ in their textures (regular and programmer art)
+    # share all blockstates and models, only the textures that programmer art changes are rendered again.
+    # The first edition is written to the given output, the others are kept in memory.
+    # Returns the number of processed leaves.
     print("Generating assets...")
-    if (os.path.exists("./assets")): shutil.rmtree("./assets")
-    copy_tree("./base/assets/", "./assets/")
-    if minify: minifyJsonFiles()
+    profiler = output.profiler
+    overrides = Overrides(jsonData)
+
+    # Leaf textures of mods are read straight from the jars, they take priority over the ones in ./input/assets
+    with profiler.stage("scanModsForTextures"):
+        modFolders = scanModsForTextures(workspace.mods)
+        mods = TexturepackIndex(workspace.mods, modFolders)
+
+    # Index the texturepacks once, instead of searching them again for every leaf (or build)
+    with profiler.stage("indexTexturepacks"):
+        texturepacks = loadTexturepackIndex(workspace.texturepacks)
+        programmerArt = loadTexturepackIndex(workspace.programmerArt) if any(edition.programmer for edition in editions) else None
+
+    if args.numpy and numpyStitching() == None: printOverride("NumPy is not installed, stitching textures with Pillow instead")
+
+    # Regular models first, the regular textures are the base for programmer art
+    groups = [sorted([edition for edition in editions if edition.legacy == legacy], key=lambda edition: edition.programmer) for legacy in (False, True)]
+    groups = [group for group in groups if len(group) > 0]
+    total = 0
+    for group in groups:
+        main = group[0]
+        legacy = main.legacy
+        main.output = output if group == groups[0] else AssetTree(profiler, budget=output.budget)
+        main.output.clear()
+        main.output.copyTree(workspace.base, "assets", args.minify)
+
+        # Resolve all overrides up front, so mistakes in overrides.json are reported before anything is generated
+        leaves = planLeaves(overrides, legacy, profiler, modFolders, mods, workspace.assets)
+
+        # Textures that programmer art renders differently can't be merged with others, as they share the models
+        changed = [leaf for leaf in leaves if leaf.should_generate_texture and usesTexturepack(leaf, programmerArt, workspace.assets)] if len(group) > 1 else []
+
+        packIndexes = [mods, texturepacks, programmerArt] if main.programmer else [mods, texturepacks]
+        filecount = generateLeaves(leaves, main.output, packIndexes, args, main.name, [textureOutfile(leaf.root, leaf.infile) for leaf in changed], workspace)
+        total += filecount
 
+        # Programmer art on top of the regular edition
+        for edition in group[1:]:
+            edition.output = AssetOverlay(main.output, profiler, budget=output.budget)
+            with profiler.stage("generateEditionTextures", edition=edition.name):
+                generateTextures(changed, edition.output, [mods, texturepacks, programmerArt], args, edition.name, workspace)
+            printCyan("Rendered {} textures again for the {} edition".format(len(changed), edition.name))
+
+        print()
+        printCyan("Processed {} leaf blocks".format(filecount))
+
+    # Wait for the files that are still being encoded and written in the background, errors are reported here
+    with profiler.stage("flushOutput"):
+        for edition in editions: edition.output.flush()
+    return total
+
+def planLeaves(overrides, legacy, profiler, modFolders={}, mods=None, assetsFolder="./input/assets"):
+    leaves = []
+    with profiler.stage("planLeaves"):
+        for root, dirs, files in os.walk(assetsFolder):
+            for infile in files:
+                if infile.endswith(".png") and assetPath(root) != "":
+                    if mods != None and mods.lookup(root, infile) != None: continue # Replaced by the texture from a mod
+                    with profiler.stage("planLeaf", "leaf", leaf=os.path.join(root, infile)):
+                        leaves.append(planLeaf(root, files, infile, overrides, legacy))
+        for root, files in modFolders.items():
+            for infile in files:
+                if infile.endswith(".png"):
+                    with profiler.stage("planLeaf", "leaf", leaf=os.path.join(root, infile)):
+                        leaves.append(planModLeaf(root, files, infile, overrides, legacy, assetsFolder))
+    for section, entry in overrides.findUnknownIds(leaves):
+        printOverride(f"Unknown ID in overrides.json ({section}): {entry}")
+    return leaves
+
+def generateLeaves(leaves, output, packIndexes, args, cacheName, pinnedTextures=(), workspace=Workspace()) -> int:
     filecount = 0
-    if (args.programmer): unpackTexturepacks("./input/programmer_art")
-    unpackTexturepacks()
-    unpackMods()
-    scanModsForTextures()
-
-    for root, dirs, files in os.walk("./input/assets"):
-        for infile in files:
-            if infile.endswith(".png") and (len(root.split("/")) > 3):
-                filecount += processLeaf(root, files, infile, jsonData, args)
-
-    print()
-    if (args.programmer): cleanupTexturepacks("./input/programmer_art")
-    cleanupTexturepacks()
-    cleanupMods()
-    printCyan("Processed {} leaf blocks".format(filecount))
-
-def processLeaf(root, files, infile, jsonData, args) -> int:
+    profiler = output.profiler
+    # Textures of unchanged leaves are reused from the last build
+    buildCache = None if args.no_cache else BuildCache(cacheName, workspace.buildCache)
+    jsonBuffer = JsonBuffer(output, minify=args.minify)
+
+    # Textures may be generated in parallel, blockstates and models are collected in order and written once
+    with profiler.stage("generateLeaves"):
+        with TextureWorkers(args.jobs, output, packIndexes, buildCache, args.numpy, args.optimize_png, workspace) as textureWorkers:
+            for leaf in leaves:
+                if leaf.skipped: continue
+                with profiler.stage("processLeaf", "leaf", leaf=os.path.join(leaf.root, leaf.infile)):
+                    filecount += processLeaf(leaf, jsonBuffer, textureWorkers)
+        if args.dedupe_textures:
+            textures = [textureOutfile(leaf.root, leaf.infile) for leaf in leaves if not leaf.skipped and leaf.should_generate_texture]
+            with profiler.stage("dedupeTextures"): dedupeTextures(textures, output, jsonBuffer, pinnedTextures)
+        with profiler.stage("writeJsonFiles"): jsonBuffer.flush()
+    profiler.count("leavesProcessed", filecount)
+    pruneBuildCache(buildCache, textureWorkers, output)
+    return filecount
+
+def generateTextures(leaves, output, packIndexes, args, cacheName, workspace=Workspace()):
+    buildCache = None if args.no_cache else BuildCache(cacheName, workspace.buildCache)
+    with TextureWorkers(args.jobs, output, packIndexes, buildCache, args.numpy, args.optimize_png, workspace) as textureWorkers:
+        for leaf in leaves: textureWorkers.submit(leaf.root, leaf.infile)
+    pruneBuildCache(buildCache, textureWorkers, output)
+
+def dedupeTextures(textures, output, jsonBuffer, pinnedTextures=()):
+    # Keeps only the first of several identical textures and points the models of the others to it
+    firstTextures = {} # Hash of the texture -> first texture with that content
+    replacements = {}
+    for texture in dict.fromkeys(textures):
+        if texture in pinnedTextures or not output.exists(texture): continue
+        digest = hashlib.sha256(output.readBytes(texture)).digest()
+        if digest not in firstTextures:
+            firstTextures[digest] = texture
+            continue
+        replacements[textureId(texture)] = textureId(firstTextures[digest])
+        output.remove(texture)
+    output.profiler.count("texturesDeduplicated", len(replacements))
+    jsonBuffer.replaceTextures(replacements)
+    if len(replacements) > 0: printCyan("Merged {} identical textures".format(len(replacements)))
+
+def textureId(path):
+    # "assets/minecraft/textures/block/oak_leaves.png" -> "minecraft:block/oak_leaves"
+    namespace, texture = os.path.splitext(path)[0].replace(os.sep, "/").split("/textures/", 1)
+    return namespace.split("/")[-1] + ":" + texture
+
+def pruneBuildCache(buildCache, textureWorkers, output):
+    if buildCache == None: return
+    # Textures are stored in the cache while they're written in the background, they must all be stored first
+    with output.profiler.stage("flushOutput"): output.flush()
+    pruned = buildCache.prune(textureWorkers.cacheKeys)
+    if pruned > 0: printCyan("Removed {} outdated textures from the build cache".format(pruned))
+
+def usesTexturepack(leaf, packIndex, assetsFolder="./input/assets") -> bool:
+    # Checks whether the texturepack contains the leaf texture or one of its texture stitching neighbours
+    sources = [os.path.join(leaf.root, leaf.infile)] + list(createTextureMap(leaf.root, leaf.infile, assetsFolder=assetsFolder).values())
+    return any(packIndex.lookup(os.path.dirname(source), os.path.basename(source)) != None for source in sources)
+
+def planModLeaf(root, files, infile, overrides, legacy=False, assetsFolder="./input/assets") -> LeafBlock:
+    # Only the texture comes from the mod, its .betterleaves.json may come from input/assets
+    jsonRoot = betterleavesJsonRoot(root, infile, assetsFolder)
+    return planLeaf(root, files if jsonRoot == root else os.listdir(jsonRoot), infile, overrides, legacy, jsonRoot)
+
+def planLeaf(root, files, infile, overrides, legacy=False, jsonRoot=None) -> LeafBlock:
+    # files are those of jsonRoot, the folder of the .betterleaves.json, which is the texture's folder by default
     texture_name = infile.replace(".png", "")
-    leaf = LeafBlock(root.split("/")[3], texture_name, texture_name)
-
-    notint_overrides = jsonData["noTint"]
-    block_texture_overrides = jsonData["blockTextures"]
-    overlay_textures = jsonData["overlayTextures"]
-    overlay_variants = jsonData["overlayVariants"]
-    compileonly_textures = jsonData["compileOnly"]
-    block_id_overrides = jsonData["blockIds"]
-    leaves_with_carpet = jsonData["leavesWithCarpet"]
-    dynamictrees_namespaces = jsonData["dynamicTreesNamespaces"]
-    generate_itemmodels_overrides = jsonData["generateItemModels"]
-    block_state_copies = jsonData["blockStateCopies"]
+    folders = assetPath(root).split("/") # Namespace, "textures", "block" and possibly a subfolder
+    leaf = LeafBlock(folders[0], texture_name, texture_name, root, infile)
 
     # Handle leaf textures in subfolders
-    if (len(root.split("/")) > 6):
-        leaf.texture_prefix = root.split("/")[6]+"/"
+    if (len(folders) > 3):
+        leaf.texture_prefix = folders[3]+"/"
         if (leaf.block_name == "leaves"): # For mods that use a structure like "texture/woodtype/leaves.png"
             leaf.block_name = leaf.texture_prefix.replace("/", "_")+leaf.block_name
             printGreen(leaf.getId())
@@ -69,29 +190,29 @@ def processLeaf(root, files, infile, jsonData, args) -> int:
     else: printGreen(leaf.getId())
 
     # We don't want to generate assets for compile-only or overlay textures
-    if leaf.getTextureId() in compileonly_textures or leaf.getTextureId() in overlay_textures.values():
-        printOverride(f"Skipping {'compile-only' if leaf.getTextureId() in compileonly_textures else 'overlay'} texture")
-        return 0
+    if leaf.getTextureId() in overrides.compile_only or leaf.getTextureId() in overrides.overlay_texture_ids:
+        printOverride(f"Skipping {'compile-only' if leaf.getTextureId() in overrides.compile_only else 'overlay'} texture")
+        leaf.skipped = True
+        return leaf
 
-    leaf.use_legacy_model = shouldUseLegacyModel(leaf, root, infile, args)
+    leaf.use_legacy_model = shouldUseLegacyModel(leaf, root, infile, legacy)
 
     # Generate texture
-    if not (leaf.use_legacy_model or leaf.getId() in overlay_variants.keys()):
-        generateTexture(root, infile, args.programmer)
+    leaf.should_generate_texture = not (leaf.use_legacy_model or leaf.getId() in overrides.overlay_variants)
 
     # Set block id and apply overrides
-    if leaf.getId() in block_id_overrides:
-        leaf.block_id_override = block_id_overrides[leaf.getId()]
+    if leaf.getId() in overrides.block_ids:
+        leaf.block_id_override = overrides.block_ids[leaf.getId()]
         printOverride("ID Override: "+leaf.getId())
 
     # Set texture id and apply overrides
-    leaf.has_texture_override = leaf.getId() in block_texture_overrides
+    leaf.has_texture_override = leaf.getId() in overrides.block_textures
     if leaf.has_texture_override:
-        leaf.texture_id_override = block_texture_overrides[leaf.getId()]
+        leaf.texture_id_override = overrides.block_textures[leaf.getId()]
         printOverride("Texture Override: "+leaf.getTextureId())
 
     # Check if the block appears in the notint overrides
-    leaf.has_no_tint = leaf.getId() in notint_overrides
+    leaf.has_no_tint = leaf.getId() in overrides.no_tint
     if leaf.use_legacy_model:
         leaf.base_model = "leaves_legacy"
     elif leaf.has_no_tint:
@@ -99,58 +220,104 @@ def processLeaf(root, files, infile, jsonData, args) -> int:
         printOverride("No tint")
 
     # Check if the block has an additional overlay texture
-    if leaf.getId() in overlay_textures:
+    if leaf.getId() in overrides.overlay_textures:
         leaf.base_model = "leaves_overlay"
-        leaf.overlay_texture_id = overlay_textures[leaf.getId()]
+        leaf.overlay_texture_id = overrides.overlay_textures[leaf.getId()]
         printOverride("Has overlay texture: "+leaf.overlay_texture_id)
-    elif leaf.getId() in overlay_variants:
+    elif leaf.getId() in overrides.overlay_variants:
         leaf.base_model = "leaves_overlay"
         leaf.overlay_texture_id = leaf.getTextureId()
-        leaf.texture_id_override = overlay_variants[leaf.getId()]
+        leaf.texture_id_override = overrides.overlay_variants[leaf.getId()]
         printOverride("Has overlay variant: "+leaf.texture_id_override)
 
     # Check if the block has a dynamic trees addon namespace
-
-    if (leaf.namespace) in dynamictrees_namespaces:
-        leaf.dynamictrees_namespace = dynamictrees_namespaces[leaf.namespace]
+    if (leaf.namespace) in overrides.dynamictrees_namespaces:
+        leaf.dynamictrees_namespace = overrides.dynamictrees_namespaces[leaf.namespace]
 
     # Check if the block should generate an item model
-    if leaf.getId() in generate_itemmodels_overrides:
+    if leaf.getId() in overrides.generate_item_models:
         leaf.should_generate_item_model = True
         printOverride("Also generating item model")
 
+    # Certain mods contain leaf carpets, or blocks that use the same blockstate
+    leaf.carpet_ids = overrides.leaves_with_carpet.get(leaf.getId(), ())
+    leaf.block_state_copies = overrides.block_state_copies.get(leaf.getId(), ())
+
     # Check for blockstate data
-    applyJson(leaf, root, infile, files)
+    applyJson(leaf, jsonRoot if jsonRoot != None else root, infile, files)
+
+    leaf.freeze()
+    return leaf
+
+def processLeaf(leaf, output, textureWorkers) -> int:
+    # Generate texture
+    # The processLeaf stage already times the leaf, unless its texture is generated by a worker process
+    if leaf.should_generate_texture:
+        textureWorkers.submit(leaf.root, leaf.infile, timeLeaf=False)
+
+    generateLeafJson(leaf, output)
+    return 1
 
+def generateLeafJson(leaf, output):
     # Generate blockstates & models
-    generateBlockstate(leaf, block_state_copies)
-    generateBlockModels(leaf)
-    generateItemModel(leaf)
+    generateBlockstate(leaf, output)
+    generateBlockModels(leaf, output)
+    generateItemModel(leaf, output)
 
     # Certain mods contain leaf carpets.
     # Because we change the leaf texture, we need to fix the carpet models.
-    generateCarpet(leaf, leaves_with_carpet)
-
-    return 1
+    generateCarpet(leaf, output)
 
-def shouldUseLegacyModel(leaf, root, infile, args) -> bool:
-    texture = Image.open(os.path.join(root, infile))
-    if texture.size[0] != texture.size[1]:
+def shouldUseLegacyModel(leaf, root, infile, legacy) -> bool:
+    # Only the size is needed, which is read from the PNG header without decoding the texture
+    if getTextureInfo(os.path.join(root, infile)).isAnimated():
         printOverride("Animated – using legacy model")
         return True
-    if args.legacy:
+    if legacy:
         printOverride("Using legacy model as requested")
         return True
     return False
 
-def generateCarpet(leaf, leaves_with_carpet):
-    if (leaf.getId()) not in leaves_with_carpet: return
+def buildDependencyGraph(leaves, packIndexes, workspace=Workspace()) -> DependencyGraph:
+    graph = DependencyGraph()
+    for leaf in leaves: addLeafToGraph(graph, leaf, packIndexes, workspace)
+    return graph
+
+def addLeafToGraph(graph, leaf, packIndexes, workspace=Workspace()):
+    # The blockstates and models a leaf writes are found by generating them without writing anything
+    recorder = PathRecorder()
+    if not leaf.skipped:
+        with contextlib.redirect_stdout(io.StringIO()): generateLeafJson(leaf, recorder)
+    graph.addLeaf((leaf.root, leaf.infile), leafFiles(leaf, recorder.paths, packIndexes, workspace) if not leaf.skipped else {})
+
+def explain(jsonData, args, ids, workspace=Workspace()):
+    # Prints the files generated for the given blocks (or textures) and the input files each of them is made from.
+    # Ids that don't belong to a leaf are looked up as input textures, printing the leaves that use them instead.
+    with contextlib.redirect_stdout(io.StringIO()):
+        modFolders = scanModsForTextures(workspace.mods)
+        mods = TexturepackIndex(workspace.mods, modFolders)
+        leaves = planLeaves(Overrides(jsonData), args.legacy, Profiler(), modFolders, mods, workspace.assets)
+        packIndexes = [mods, loadTexturepackIndex(workspace.texturepacks)] + ([loadTexturepackIndex(workspace.programmerArt)] if args.programmer else [])
+    graph = buildDependencyGraph(leaves, packIndexes, workspace)
+
+    for id in ids:
+        matches = [leaf for leaf in leaves if id in (leaf.getId(), leaf.getTextureId(), leaf.namespace + ":" + leaf.block_name)]
+        for leaf in matches:
+            printGreen("{} ({})".format(leaf.getId(), os.path.normpath(os.path.join(leaf.root, leaf.infile))))
+            if leaf.skipped: printOverride("Skipped, no files are generated")
+            for generated, inputs in sorted(graph.leafFiles[(leaf.root, leaf.infile)].items()):
+                print("  " + generated)
+                for path in sorted(inputs): print("    <- " + path)
 
-    carpet_ids = leaves_with_carpet[leaf.getId()]
-    # In case only one carpet is provided (as a string), turn it into a list
-    if not isinstance(carpet_ids, list): carpet_ids = [carpet_ids]
+        namespace, texture = id.split(":", 1) if ":" in id else ("minecraft", id)
+        dependents = graph.affectedLeaves([f"{workspace.assets}/{namespace}/textures/{texture}.png"]) - {(leaf.root, leaf.infile) for leaf in matches}
+        if len(dependents) > 0:
+            printGreen(f"{id} is stitched into:")
+            for root, infile in sorted(dependents): print("  " + os.path.normpath(os.path.join(root, infile)))
+        elif len(matches) == 0: printOverride(f"{id} isn't a leaf block or used by one")
 
-    for carpet_id in carpet_ids:
+def generateCarpet(leaf, output):
+    for carpet_id in leaf.carpet_ids:
         carpet = CarpetBlock(carpet_id, leaf)
-        generateCarpetAssets(carpet)
+        generateCarpetAssets(carpet, output)
         printOverride(f"Generating leaf carpet: {carpet.carpet_id}")
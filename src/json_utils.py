@@ -1,18 +1,64 @@
-import os
 import json
+from json.encoder import encode_basestring_ascii
 
-minify = False
-
-def minifyJsonFiles(rootDir="./assets"):
-    for root, dirs, files in os.walk(rootDir):
-        for infile in files:
-            if infile.endswith(".json"):
-                minifyExistingJson(root, infile)
-def minifyExistingJson(root, infile):
-    with open(os.path.join(root, infile), "r") as rf:
-        data = json.load(rf)
-        with open(os.path.join(root, infile), "w") as wf:
-            json.dump(data, wf, separators=(',', ':'))
-
-def dumpJson(data, f):
-    json.dump(data, f, separators=(',', ':')) if minify else json.dump(data, f, indent=4)
+try:
+    import orjson
+except ImportError: # orjson is optional, it only speeds up writing minified files
+    orjson = None
+
+def encodeIndented(data) -> str:
+    return json.dumps(data, indent=4)
+
+def encodeMinified(data) -> str:
+    # orjson writes the same compact output as the json module, except for non-ASCII characters, which it doesn't escape.
+    # Those files are encoded by the json module instead, so the output doesn't depend on the installed packages.
+    if orjson != None:
+        text = orjson.dumps(data).decode()
+        if text.isascii(): return text
+    return json.dumps(data, separators=(',', ':'))
+
+def minifyJson(data: bytes) -> bytes:
+    return json.dumps(json.loads(data), separators=(',', ':')).encode()
+
+def dumpJson(data, f, minify=False):
+    f.write(dumpsJson(data, minify))
+
+def dumpsJson(data, minify=False) -> str:
+    # Whether to minify is passed along (instead of being a setting), so builds with different settings can run at the same time
+    if type(data) is JsonText: return data.text(minify)
+    return encodeMinified(data) if minify else encodeIndented(data)
+
+class JsonText:
+    # A file rendered from a JsonTemplate, which is only serialized once it's written
+    __slots__ = ("template", "values")
+
+    def __init__(self, template, values):
+        self.template = template
+        self.values = values
+
+    def text(self, minify=False) -> str:
+        return self.template.patterns[minify].format(**{key: encode_basestring_ascii(value) for key, value in self.values.items()})
+
+    def replace(self, replacements):
+        # Replaces values, e.g. {"mod:block/b_leaves": "mod:block/a_leaves"}
+        return JsonText(self.template, {key: replacements.get(value, value) for key, value in self.values.items()})
+
+class JsonTemplate:
+    # Serializes JSON files that always have the same structure (like block models) by filling in the strings,
+    # which is a lot faster than encoding the whole structure every time.
+    # Values of the form "${name}" are placeholders.
+    def __init__(self, data):
+        self.patterns = {False: self.compile(json.dumps(data, indent=4)), True: self.compile(json.dumps(data, separators=(',', ':')))}
+
+    @staticmethod
+    def compile(text):
+        # Turns the serialized template into a format string, the placeholders are replaced with encoded strings
+        pattern = text.replace("{", "{{").replace("}", "}}")
+        while '"${{' in pattern:
+            start = pattern.index('"${{')
+            end = pattern.index('}}"', start)
+            pattern = pattern[:start] + "{" + pattern[start + 4:end] + "}" + pattern[end + 3:]
+        return pattern
+
+    def render(self, **values) -> JsonText:
+        return JsonText(self, values)
@@ -1,28 +1,27 @@
 import os
-import zipfile
-import shutil
+import re
+from concurrent.futures import ThreadPoolExecutor
+from src.archive_utils import listArchive
 
-def unpackMods():
-    for root, dirs, files in os.walk("./input/mods"):
-        for infile in files:
-            if infile.endswith(".jar"):
-                print("Unpacking mod: "+infile)
-                zf = zipfile.ZipFile(os.path.join(root, infile), 'r')
-                zf.extractall(os.path.join(root, infile.replace(".jar", "_temp")))
-                zf.close()
+# Leaf textures inside of a mod, along with their texture stitching and animation files
+leafTextureFiles = re.compile(r"^assets/([^/]+)/textures/block/(?:.+/)?[^/]*leaves[^/]*\.(?:png|betterleaves\.json|png\.mcmeta)$")
 
-def cleanupMods():
-    if (os.path.exists("./input/mods")): shutil.rmtree("./input/mods")
-    os.makedirs("./input/mods")
+def scanModsForTextures(modFolder="./input/mods", jobs=8) -> dict:
+    # Mods are read in place: only the central directory of each jar is read (several jars at once),
+    # nothing is extracted or copied. Returns the folders inside of the jars that contain leaf textures,
+    # along with the matching files in them.
+    jars = []
+    for root, dirs, files in os.walk(modFolder):
+        dirs.sort()
+        jars += [os.path.join(root, jarfile) for jarfile in sorted(files) if jarfile.endswith(".jar")]
 
-def scanModsForTextures():
-    for root, dirs, files in os.walk("./input/mods"):
-        for infile in files:
-            if len(root.split("assets")) > 1:
-                assetpath = root.split("assets")[1][1:]
-                modid = assetpath.split("textures")[0].replace("/", "")
-                if "textures/block" in root and infile.endswith(".png") and "leaves" in infile:
-                    print(f"Found texture {assetpath}/{infile} in mod {modid}")
-                    inputfolder = os.path.join("./input/assets/", assetpath)
-                    os.makedirs(inputfolder, exist_ok=True)
-                    shutil.copyfile(os.path.join(root, infile), os.path.join(inputfolder, infile))
+    folders = {}
+    with ThreadPoolExecutor(jobs) as executor:
+        for jar, members in zip(jars, executor.map(listArchive, jars)):
+            print("Scanning mod: "+os.path.basename(jar))
+            for member in members:
+                match = leafTextureFiles.match(member)
+                if match == None: continue
+                if member.endswith(".png"): print(f"Found texture {member[len('assets/'):]} in mod {match.group(1)}")
+                folders.setdefault(os.path.join(jar, os.path.dirname(member)), []).append(os.path.basename(member))
+    return folders
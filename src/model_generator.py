@@ -1,20 +1,28 @@
-import os
-from src.json_utils import dumpJson
+from src.json_utils import JsonTemplate
 
-def generateBlockModels(leaf):
-    mod_namespace = leaf.getId().split(":")[0]
-    block_name = leaf.getId().split(":")[1]
-    # Create models folder if it doesn't exist already
-    os.makedirs("assets/{}/models/block/".format(mod_namespace), exist_ok=True)
+# Most models only differ in their parent and texture
+MODEL_TEMPLATE = JsonTemplate({
+    "parent": "${parent}",
+    "textures": {
+        "all": "${all}"
+    }
+})
+
+def generateBlockModels(leaf, output):
+    mod_namespace = leaf.id_namespace
+    block_name = leaf.id_name
 
     # Create the four individual leaf models
     for i in range(1, 5):
         # Create structure for block model file
         block_model_file = f"assets/{mod_namespace}/models/block/{block_name}{i}.json"
+        if leaf.overlay_texture_id == "" and not leaf.sprite_overrides:
+            output.writeJson(block_model_file, MODEL_TEMPLATE.render(parent=f"betterleaves:block/{leaf.base_model}{i}", all=leaf.texture_id))
+            continue
         block_model_data = {
             "parent": f"betterleaves:block/{leaf.base_model}{i}",
             "textures": {
-                "all": f"{leaf.getTextureId()}"
+                "all": f"{leaf.texture_id}"
             }
         }
         # Add overlay texture on request
@@ -27,19 +35,17 @@ def generateBlockModels(leaf):
                 block_model_data["textures"][key] = leaf.sprite_overrides[key];
 
         # Write block model file
-        with open(block_model_file, "w") as f:
-            dumpJson(block_model_data, f)
-
-def generateItemModel(leaf):
-    mod_namespace = leaf.getId().split(":")[0]
-    block_name = leaf.getId().split(":")[1]
+        output.writeJson(block_model_file, block_model_data)
 
-    # Create models folder if it doesn't exist already
-    os.makedirs("assets/{}/models/block/".format(mod_namespace), exist_ok=True)
+def generateItemModel(leaf, output):
+    mod_namespace = leaf.id_namespace
+    block_name = leaf.id_name
 
     block_item_model_file = f"assets/{mod_namespace}/models/block/{block_name}.json"
 
-    if leaf.has_texture_override: # Used for items that have a different texture than the block model
+    if leaf.overlay_texture_id == "": # Nothing but the texture can differ
+        item_model_data = MODEL_TEMPLATE.render(parent=f"betterleaves:block/{leaf.base_model}", all=f"{mod_namespace}:block/{block_name}" if leaf.has_texture_override else leaf.texture_id)
+    elif leaf.has_texture_override: # Used for items that have a different texture than the block model
         item_model_data = {
             "parent": f"betterleaves:block/{leaf.base_model}",
             "textures": {
@@ -50,20 +56,15 @@ def generateItemModel(leaf):
         item_model_data = {
             "parent": f"betterleaves:block/{leaf.base_model}",
             "textures": {
-                "all": f"{leaf.getTextureId()}"
+                "all": f"{leaf.texture_id}"
             }
         }
     # Add overlay texture on request
     if (leaf.overlay_texture_id != ""):
         item_model_data["textures"]["overlay"] = leaf.overlay_texture_id
 
-    with open(block_item_model_file, "w") as f:
-        dumpJson(item_model_data, f)
+    output.writeJson(block_item_model_file, item_model_data)
 
     if leaf.should_generate_item_model:
-        # Create models folder if it doesn't exist already
-        os.makedirs("assets/{}/models/item/".format(mod_namespace), exist_ok=True)
-
         item_model_file = f"assets/{mod_namespace}/models/item/{block_name}.json" if (leaf.blockstate_data == None) else f"assets/{leaf.blockstate_data.namespace}/models/item/{leaf.blockstate_data.block_name}.json"
-        with open(item_model_file, "w") as f:
-            dumpJson(item_model_data, f)
+        output.writeJson(item_model_file, item_model_data)
@@ -0,0 +1,33 @@
+# Optional NumPy implementation of the texture stitching, producing the exact same pixels as the Pillow one.
+# Instead of pasting the texture nine times onto a canvas, the 3x3 grid is assembled by reshaping an array,
+# and the mask is applied to all channels at once.
+import numpy as np
+from PIL import Image
+
+def canStitch(vanilla, neighbours) -> bool:
+    # Odd sizes and neighbours of a different size don't line up with the grid, these are left to Pillow
+    width, height = vanilla.size
+    return width % 2 == 0 and height % 2 == 0 and all(texture.size == vanilla.size for texture in neighbours.values())
+
+def toArray(image):
+    return np.asarray(image if image.mode == "RGBA" else image.convert("RGBA"))
+
+def stitchTexture(vanilla, neighbours, mask) -> Image.Image:
+    # neighbours contains the texture stitching images by grid index (1 to 9)
+    width, height = vanilla.size
+    tiles = np.empty((3, 3, height, width, 4), dtype=np.uint8)
+    tiles[:, :] = toArray(vanilla)
+    for index, neighbour in neighbours.items():
+        index = int(index) - 1
+        tiles[index // 3, index % 3] = toArray(neighbour)
+
+    # Lay out the tiles as one big 3x3 grid and cut out the centered area that's twice the texture size
+    grid = tiles.transpose(0, 2, 1, 3, 4).reshape(3 * height, 3 * width, 4)
+    out = grid[height // 2 : height // 2 + 2 * height, width // 2 : width // 2 + 2 * width].astype(np.uint32)
+
+    # Blend with the transparent background using the mask, rounding exactly like Image.composite
+    mask = np.asarray(mask).astype(np.uint32)[..., np.newaxis]
+    transparent = np.array([255, 255, 255, 0], dtype=np.uint32)
+    blended = transparent * (255 - mask) + out * mask + 128
+    blended = ((blended >> 8) + blended) >> 8
+    return Image.fromarray(blended.astype(np.uint8), "RGBA")
@@ -0,0 +1,310 @@
+import copy
+import io
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.json_utils import JsonText, dumpsJson, minifyJson
+from src.profiler import Profiler
+from src.zip_utils import zipdir
+
+WRITERS = 4 # Background threads per output
+MAX_PENDING = 64 # Files that may wait to be written, so finished textures don't pile up in memory
+
+class MemoryBudget:
+    # Limits the memory taken by files that wait to be encoded and written (mostly stitched textures, 4 MB each for 512px packs).
+    # Can be shared by several outputs, e.g. the editions of a build. A file larger than the whole budget is let through
+    # once nothing else is pending, so it can't block forever.
+    def __init__(self, megabytes=None):
+        self.limit = megabytes * 1024 * 1024 if megabytes != None else None # None for no limit
+        self.used = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, size) -> bool:
+        # Returns whether it had to wait
+        if self.limit == None: return False
+        with self.condition:
+            waited = False
+            while self.used > 0 and self.used + size > self.limit:
+                waited = True
+                self.condition.wait()
+            self.used += size
+            return waited
+
+    def release(self, size):
+        if self.limit == None: return
+        with self.condition:
+            self.used -= size
+            self.condition.notify_all()
+
+class WriteBehind:
+    # Encodes and writes files on a few background threads, while the build moves on to the next leaf.
+    # PNG encoding (zlib) and file I/O release the GIL, so they overlap with stitching the next texture.
+    # Reading a file waits for its pending write, flush() waits for all of them and reports the files that failed.
+    def initWriters(self, writers, budget=None):
+        self.writers = writers
+        self.budget = budget if budget != None else MemoryBudget()
+        self.pool = None
+        self.pending = {} # Path -> future of its background write
+        self.errors = []
+        self.slots = threading.Semaphore(MAX_PENDING) if writers > 0 else None
+
+    def writeLater(self, path, encode, size=0):
+        # encode returns the content of the file, it's called on a background thread.
+        # size is the memory held until then (e.g. by the image to encode), which counts towards the budget.
+        if self.writers == 0: return self.writeInBackground(path, encode, 0)
+        self.wait(path) # A newer version of the file replaces the pending one
+        if self.pool == None: self.pool = ThreadPoolExecutor(self.writers, thread_name_prefix="writer")
+        self.slots.acquire()
+        if self.budget.acquire(size): self.profiler.count("memoryBudgetWaits")
+        self.pending[os.path.normpath(path)] = self.pool.submit(self.writeInBackground, path, encode, size)
+
+    def writeInBackground(self, path, encode, size):
+        try: self.writeFile(path, encode())
+        except Exception as e: self.errors.append((path, e))
+        finally:
+            if self.writers > 0:
+                self.budget.release(size)
+                self.slots.release()
+
+    def wait(self, path):
+        future = self.pending.pop(os.path.normpath(path), None) if self.writers > 0 else None
+        if future != None: future.result()
+
+    def flush(self):
+        for future in self.pending.values(): future.result()
+        self.pending = {}
+        if self.pool != None: self.pool.shutdown()
+        self.pool = None
+        errors = self.takeErrors()
+        for path, error in errors: print(f"Error while writing '{path}': {error!r}")
+        if len(errors) > 0: raise IOError(f"{len(errors)} file(s) couldn't be written")
+
+    def takeErrors(self):
+        # Files that couldn't be written, as (path, error)
+        errors, self.errors = self.errors, []
+        return errors
+
+    def writeDirectly(self):
+        # Worker processes write their files right away, they already run in parallel.
+        # Their errors are collected like those of background writes, and sent back to the main process.
+        self.writers, self.pool, self.pending, self.errors, self.slots, self.budget = 0, None, {}, [], None, None
+
+    def __getstate__(self):
+        self.flush()
+        state = dict(self.__dict__)
+        state.update(writers=0, pool=None, pending={}, errors=[], slots=None, budget=None)
+        return state
+
+class AssetFolder(WriteBehind):
+    # Writes the generated assets to the ./assets folder, which is zipped up afterwards
+    shared = True # Worker processes can write to the folder directly
+
+    def __init__(self, root=".", profiler=None, writers=WRITERS, budget=None):
+        self.root = root
+        self.profiler = profiler if profiler != None else Profiler()
+        self.folders = set() # Folders that were already created, so os.makedirs only runs once per folder
+        self.initWriters(writers, budget)
+
+    def clear(self):
+        self.flush()
+        self.folders = set()
+        if (os.path.exists(os.path.join(self.root, "assets"))): shutil.rmtree(os.path.join(self.root, "assets"))
+
+    def copyTree(self, source, path, minify=False):
+        # distutils' copy_tree remembers created folders across calls, which breaks repeated builds in the same process
+        with self.profiler.stage("copyBaseAssets", minify=minify):
+            shutil.copytree(source, os.path.join(self.root, path), copy_function=copyMinified if minify else shutil.copy2, dirs_exist_ok=True)
+
+    def exists(self, path):
+        self.wait(path)
+        return os.path.exists(os.path.join(self.root, path))
+
+    def readJson(self, path):
+        self.wait(path)
+        with open(os.path.join(self.root, path), "r") as f:
+            return json.load(f)
+
+    def readBytes(self, path):
+        self.wait(path)
+        with open(os.path.join(self.root, path), "rb") as f:
+            return f.read()
+
+    def remove(self, path):
+        self.wait(path)
+        os.remove(os.path.join(self.root, path))
+
+    def writeJson(self, path, data, minify=False):
+        self.writeBytes(path, dumpsJson(data, minify).encode())
+
+    def writeBytes(self, path, data):
+        self.writeLater(path, lambda: data)
+
+    def writeFile(self, path, data):
+        folder = os.path.dirname(os.path.join(self.root, path))
+        if folder not in self.folders:
+            os.makedirs(folder, exist_ok=True)
+            self.folders.add(folder)
+        with open(os.path.join(self.root, path), "wb") as f:
+            f.write(data)
+        self.profiler.count("filesWritten")
+        self.profiler.count("bytesWritten", len(data))
+
+    def zipEntries(self, exclude=()):
+        self.flush()
+        return zipdir(os.path.join(self.root, "assets/"), exclude)
+
+def copyMinified(source, destination):
+    # JSON files are minified while they are copied, everything else is copied as is
+    if not source.endswith(".json"): return shutil.copy2(source, destination)
+    with open(source, "rb") as f: data = minifyJson(f.read())
+    with open(destination, "wb") as f: f.write(data)
+    return destination
+
+class AssetTree(WriteBehind):
+    # Keeps the generated assets in memory and writes them straight into the zip file,
+    # without staging thousands of small files in the ./assets folder first.
+    # Only encoding happens in the background, storing the files is instant.
+    shared = False # Worker processes fill their own tree, which is merged afterwards
+
+    def __init__(self, profiler=None, writers=WRITERS, budget=None):
+        self.files = {}
+        self.profiler = profiler if profiler != None else Profiler()
+        self.initWriters(writers, budget)
+
+    def clear(self):
+        self.flush()
+        self.files = {}
+
+    def copyTree(self, source, path, minify=False):
+        with self.profiler.stage("copyBaseAssets", minify=minify):
+            for root, dirs, files in os.walk(source):
+                for infile in files:
+                    with open(os.path.join(root, infile), "rb") as f: data = f.read()
+                    if minify and infile.endswith(".json"): data = minifyJson(data)
+                    self.files[os.path.normpath(os.path.join(path, os.path.relpath(os.path.join(root, infile), source)))] = data
+
+    def exists(self, path):
+        self.wait(path)
+        return os.path.normpath(path) in self.files
+
+    def readJson(self, path):
+        self.wait(path)
+        return json.loads(self.files[os.path.normpath(path)])
+
+    def readBytes(self, path):
+        self.wait(path)
+        return self.files[os.path.normpath(path)]
+
+    def remove(self, path):
+        self.wait(path)
+        del self.files[os.path.normpath(path)]
+
+    def writeJson(self, path, data, minify=False):
+        self.writeBytes(path, dumpsJson(data, minify).encode())
+
+    def writeBytes(self, path, data):
+        self.wait(path)
+        self.writeFile(path, data)
+
+    def writeFile(self, path, data):
+        self.files[os.path.normpath(path)] = data
+        self.profiler.count("filesWritten")
+        self.profiler.count("bytesWritten", len(data))
+
+    def merge(self, files):
+        self.files.update(files)
+
+    def zipEntries(self, exclude=()):
+        self.flush()
+        return {path: data for path, data in self.files.items() if path not in exclude}
+
+class AssetOverlay(AssetTree):
+    # Keeps only the files of an edition that differ from another edition's output (e.g. programmer art textures)
+    def __init__(self, base, profiler=None, writers=WRITERS, budget=None):
+        super().__init__(profiler, writers, budget)
+        self.base = base
+
+    def clear(self):
+        self.flush()
+        self.files = {}
+
+    def exists(self, path):
+        return super().exists(path) or self.base.exists(path)
+
+    def readJson(self, path):
+        return super().readJson(path) if super().exists(path) else self.base.readJson(path)
+
+    def zipEntries(self, exclude=()):
+        self.flush()
+        return self.base.zipEntries(set(exclude) | set(self.files)) | super().zipEntries(exclude)
+
+class JsonBuffer:
+    # Collects the blockstates and models of a build and writes each file exactly once at the end,
+    # instead of reading back and rewriting the blockstates that several leaves add variants to.
+    # Files with the same content (e.g. blockstate copies) share one object, which is only serialized once.
+    # Existing files are read from base, which is the output itself unless it already contains generated files.
+    def __init__(self, output, base=None, minify=False):
+        self.output = output
+        self.base = base if base != None else output
+        self.minify = minify
+        self.profiler = output.profiler
+        self.files = {}
+        self.references = {} # id of a pending object -> number of files it is written to
+
+    def exists(self, path):
+        return os.path.normpath(path) in self.files or self.base.exists(path)
+
+    def readJson(self, path):
+        path = os.path.normpath(path)
+        if path not in self.files: return self.base.readJson(path)
+        data = self.files[path]
+        if type(data) is JsonText: return json.loads(data.text())
+        # Other files keep the content they were written with
+        return copy.deepcopy(data) if self.references[id(data)] > 1 else data
+
+    def writeJson(self, path, data):
+        path = os.path.normpath(path)
+        if path in self.files: self.references[id(self.files[path])] -= 1
+        self.files[path] = data
+        self.references[id(data)] = self.references.get(id(data), 0) + 1
+
+    def replaceTextures(self, replacements):
+        # Points the models to other textures, e.g. {"mod:block/b_leaves": "mod:block/a_leaves"}
+        if len(replacements) == 0: return
+        replaced = {} # id of the original object -> object with replaced textures, so shared objects stay shared
+        for path, data in self.files.items():
+            if "models" not in path.split(os.sep): continue
+            if id(data) not in replaced:
+                if type(data) is JsonText: replaced[id(data)] = data.replace(replacements)
+                else:
+                    replaced[id(data)] = copy.deepcopy(data)
+                    textures = replaced[id(data)].get("textures", {})
+                    for key, texture in textures.items(): textures[key] = replacements.get(texture, texture)
+            self.files[path] = replaced[id(data)]
+        self.references = {}
+        for data in self.files.values(): self.references[id(data)] = self.references.get(id(data), 0) + 1
+
+    def flush(self, previous=None):
+        # Returns the written files. When given the files of a previous flush, only the ones that changed are written,
+        # files that aren't generated anymore are reset to their base version or removed.
+        serialized = {}
+        written = {}
+        for path, data in self.files.items():
+            if id(data) not in serialized: serialized[id(data)] = dumpsJson(data, self.minify).encode()
+            else: self.profiler.count("jsonSerializationsSaved")
+            written[path] = serialized[id(data)]
+            if previous == None or previous.get(path) != written[path]: self.output.writeBytes(path, written[path])
+        for path in (previous.keys() - written.keys()) if previous != None else ():
+            if self.base.exists(path): self.output.writeBytes(path, self.base.readBytes(path))
+            else: self.output.remove(path)
+        self.files = {}
+        self.references = {}
+        return written
+
+def encodeImage(image, format):
+    data = io.BytesIO()
+    image.save(data, format)
+    return data.getvalue()
@@ -0,0 +1,83 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from src.texture_generator import generateTexture
+from src.output_utils import AssetTree
+from src.profiler import Profiler
+from src.data.workspace import Workspace
+
+# Output, pack indexes and build cache of the current worker process, set once when the worker starts
+workerOutput = None
+workerPackIndexes = ()
+workerBuildCache = None
+workerUseNumpy = False
+workerOptimize = False
+workerProfiling = False
+workerWorkspace = Workspace()
+
+def initWorker(output, packIndexes, buildCache, useNumpy, optimize, profiling, workspace):
+    global workerOutput, workerPackIndexes, workerBuildCache, workerUseNumpy, workerOptimize, workerProfiling, workerWorkspace
+    workerOutput = output
+    # Forked workers get the output as it is, without going through pickling
+    if output != None: output.writeDirectly()
+    workerPackIndexes = packIndexes
+    workerBuildCache = buildCache
+    workerUseNumpy = useNumpy
+    workerOptimize = optimize
+    workerProfiling = profiling
+    workerWorkspace = workspace
+
+def generateTextureJob(root, infile):
+    # Outputs that can't be shared between processes (e.g. in-memory trees) are sent back to the main process,
+    # together with the profiling data of this job
+    profiler = Profiler(workerProfiling)
+    output = workerOutput if workerOutput != None else AssetTree(writers=0)
+    output.profiler = profiler
+    cacheKey = generateTexture(root, infile, output, workerPackIndexes, workerBuildCache, workerUseNumpy, workerOptimize, workerWorkspace)
+    # Files that couldn't be written are reported by the main process, so they fail the build
+    return cacheKey, output.files if workerOutput == None else None, profiler.export(), output.takeErrors()
+
+class TextureWorkers:
+    # Generates leaf textures either directly (jobs=1) or spread across a pool of worker processes.
+    # Texture generation only depends on the leaf's own input files, so it can safely run out of order.
+    # Everything that reads or writes shared files (blockstates, models) stays on the calling process.
+    def __init__(self, jobs, output, packIndexes, buildCache=None, useNumpy=False, optimize=False, workspace=Workspace()):
+        self.output = output
+        self.packIndexes = packIndexes
+        self.buildCache = buildCache
+        self.useNumpy = useNumpy
+        self.optimize = optimize
+        self.workspace = workspace
+        self.pool = None
+        self.futures = []
+        self.cacheKeys = set() # Build cache entries used by the generated textures
+        if jobs == 0: jobs = os.cpu_count()
+        # Workers don't inherit the threads and locks of this process (e.g. of background writes) with forkserver
+        context = multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+        if jobs > 1: self.pool = ProcessPoolExecutor(max_workers=jobs, mp_context=context, initializer=initWorker, initargs=(output if output.shared else None, packIndexes, buildCache, useNumpy, optimize, output.profiler.enabled, workspace))
+
+    def submit(self, root, infile, timeLeaf=True):
+        # Worker processes always time their leaves, the caller only times submitting them
+        if self.pool == None: self.cacheKeys.add(generateTexture(root, infile, self.output, self.packIndexes, self.buildCache, self.useNumpy, self.optimize, self.workspace, timeLeaf))
+        else: self.futures.append(self.pool.submit(generateTextureJob, root, infile))
+
+    def finish(self):
+        if self.pool == None: return
+        try:
+            for future in self.futures:
+                cacheKey, files, profile, errors = future.result() # Re-raises errors from the workers
+                self.cacheKeys.add(cacheKey)
+                self.output.errors += errors
+                if files != None: self.output.merge(files)
+                self.output.profiler.merge(profile)
+        finally:
+            self.pool.shutdown()
+            self.futures = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type == None: self.finish()
+        elif self.pool != None: self.pool.shutdown(cancel_futures=True)
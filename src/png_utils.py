@@ -0,0 +1,25 @@
+import io
+from PIL import Image
+
+def optimizePng(data: bytes) -> bytes:
+    # Re-encodes a PNG losslessly with the smallest colour type and bit depth that fits:
+    # textures with up to 256 colours (including their alpha) become palette images.
+    # The original is kept if it's already smaller, or if the result wouldn't decode to the same pixels.
+    with Image.open(io.BytesIO(data)) as image:
+        rgba = image.convert("RGBA")
+    pixels = rgba.tobytes()
+    colors = rgba.getcolors(256)
+    if colors != None:
+        palette = [bytes(color) for count, color in colors]
+        index = {color: i for i, color in enumerate(palette)}
+        optimized = Image.frombytes("P", rgba.size, bytes(index[pixels[i:i + 4]] for i in range(0, len(pixels), 4)))
+        optimized.putpalette(b"".join(color[:3] for color in palette))
+        if any(color[3] != 255 for color in palette): optimized.info["transparency"] = bytes(color[3] for color in palette)
+    else: optimized = rgba
+
+    out = io.BytesIO()
+    optimized.save(out, "PNG", optimize=True)
+    if len(out.getvalue()) >= len(data): return data
+    with Image.open(io.BytesIO(out.getvalue())) as check:
+        if check.convert("RGBA").tobytes() != pixels: return data
+    return out.getvalue()
@@ -0,0 +1,128 @@
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError: # Not available on Windows
+    resource = None
+
+def peakRss():
+    # Highest resident memory of the current process so far, in KiB (None where it can't be measured)
+    if resource == None: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak # macOS reports bytes
+
+class StagePeak:
+    # Highest resident memory while a stage runs. Linux can reset the high-water mark of a process (VmHWM),
+    # so it's reset whenever a stage starts, after adding it to the stages that are already running.
+    # Elsewhere, the high-water mark of the whole process (so far) is all there is.
+    perStage = os.path.exists("/proc/self/clear_refs")
+    running = [] # Stages that are being measured, across all threads and profilers (the high-water mark is per process)
+    lock = threading.Lock()
+
+    def __init__(self):
+        self.peak = 0
+        if not StagePeak.perStage: return
+        with StagePeak.lock:
+            StagePeak.update()
+            try:
+                with open("/proc/self/clear_refs", "w") as f: f.write("5")
+            except OSError: # E.g. in a sandbox
+                StagePeak.perStage = False
+            StagePeak.running.append(self)
+            StagePeak.update()
+
+    def finish(self):
+        if not StagePeak.perStage: return peakRss()
+        with StagePeak.lock:
+            StagePeak.update()
+            StagePeak.running = [stage for stage in StagePeak.running if stage is not self]
+        return self.peak
+
+    @staticmethod
+    def update():
+        with open("/proc/self/status") as f:
+            hwm = next((int(line.split()[1]) for line in f if line.startswith("VmHWM:")), 0)
+        for stage in StagePeak.running: stage.peak = max(stage.peak, hwm)
+
+class Profiler:
+    # Records how long each stage of the build takes, along with counters such as files written or cache hits.
+    # Stages also record the peak memory (RSS) of the process while they ran (on Linux, elsewhere the peak so far).
+    # When disabled (the default), stages and counters cost next to nothing.
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.start = time.perf_counter_ns() // 1000
+        self.events = [] # Chrome trace events, with absolute timestamps in microseconds
+        self.counters = {}
+        self.leaves = {} # Time spent per leaf texture, in seconds
+        self.lock = threading.Lock() # Files are also written (and counted) on background threads
+
+    @contextlib.contextmanager
+    def stage(self, name, category="stage", leaf=None, **args):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter_ns() // 1000
+        memory = StagePeak() if category == "stage" else None
+        try: yield
+        finally:
+            duration = time.perf_counter_ns() // 1000 - start
+            if memory != None: args = dict(args, peakRssKiB=memory.finish())
+            self.events.append({"name": name, "cat": category, "ph": "X", "ts": start, "dur": duration, "pid": os.getpid(), "tid": threading.get_ident(), "args": args})
+            if leaf != None: self.leaves[leaf] = self.leaves.get(leaf, 0) + duration / 1000000
+
+    def count(self, name, amount=1):
+        if not self.enabled: return
+        with self.lock: self.counters[name] = self.counters.get(name, 0) + amount
+
+    def __getstate__(self):
+        # Locks can't be sent to worker processes
+        return dict(self.__dict__, lock=None)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, lock=threading.Lock())
+
+    def export(self):
+        # Used to send the results of a worker process back to the main process
+        return {"events": self.events, "counters": self.counters, "leaves": self.leaves} if self.enabled else None
+
+    def merge(self, data):
+        if data == None or not self.enabled: return
+        self.events += data["events"]
+        for name, amount in data["counters"].items(): self.count(name, amount)
+        for leaf, seconds in data["leaves"].items(): self.leaves[leaf] = self.leaves.get(leaf, 0) + seconds
+
+    def writeTrace(self, filename):
+        # Chrome trace format, can be opened in chrome://tracing or https://ui.perfetto.dev
+        events = [dict(event, ts=event["ts"] - self.start) for event in self.events]
+        events += [{"name": "counters", "ph": "C", "ts": 0, "pid": os.getpid(), "args": self.counters}]
+        with open(filename, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms", "counters": self.counters, "slowestLeaves": self.slowestLeaves(25), "peakRssKiB": self.peakRssByStage()}, f)
+
+    def peakRssByStage(self):
+        # Stages of the main process, the highest of stages that ran several times
+        peaks = {}
+        for event in self.events:
+            if event["cat"] == "stage" and event["pid"] == os.getpid() and event["args"].get("peakRssKiB") != None:
+                peaks[event["name"]] = max(peaks.get(event["name"], 0), event["args"]["peakRssKiB"])
+        return peaks
+
+    def slowestLeaves(self, amount):
+        return dict(sorted(self.leaves.items(), key=lambda leaf: leaf[1], reverse=True)[:amount])
+
+    def printSummary(self, amount=10):
+        print()
+        print("Stages (duration, {}):".format("peak memory during the stage" if StagePeak.perStage else "peak memory of the process by the end of the stage"))
+        for event in self.events:
+            if event["cat"] == "stage" and event["pid"] == os.getpid(): print(" {:>10.3f}s  {:>9}  {}".format(event["dur"] / 1000000, formatRss(event["args"].get("peakRssKiB")), event["name"]))
+        print("Counters:")
+        for name, value in sorted(self.counters.items()): print(" {:>11}  {}".format(value, name))
+        print("Slowest leaves:")
+        for leaf, seconds in self.slowestLeaves(amount).items(): print(" {:>10.3f}s  {}".format(seconds, leaf))
+
+def formatRss(kib):
+    return "{:.1f} MB".format(kib / 1024) if kib != None else "-"
@@ -1,36 +1,82 @@
+import functools
 import json
 import os
 import random
+import threading
 from PIL import Image
 
 # Local imports
 from src.texturepack_utils import scanPacksForTexture
+from src.archive_utils import assetExists, assetPath, assetState, fileState, openAsset
+from src.texture_info import getTextureInfo, loadTexture
+from src.output_utils import encodeImage
+from src.png_utils import optimizePng
 from src.utilities import printOverride
+from src.data.workspace import Workspace
 
-def generateTexture(root, infile, useProgrammerArt=False):
-    outfolder = root.replace("assets", "").replace("input", "assets")
-    os.makedirs(outfolder, exist_ok=True)
+
+def generateTexture(root, infile, output, packIndexes=(), buildCache=None, useNumpy=False, optimize=False, workspace=Workspace(), timeLeaf=True):
+    # timeLeaf is False when the caller already counts the time towards the leaf
+    with output.profiler.stage("generateTexture", "texture", leaf=os.path.join(root, infile) if timeLeaf else None):
+        return generateTextureFile(root, infile, output, packIndexes, buildCache, useNumpy, optimize, workspace)
+
+def textureOutfile(root, infile):
+    return os.path.normpath(os.path.splitext(os.path.join("assets", assetPath(root), infile))[0] + ".png")
+
+def generateTextureFile(root, infile, output, packIndexes, buildCache, useNumpy, optimize, workspace):
+    outfile = textureOutfile(root, infile)
+    profiler = output.profiler
 
     # Check for texture stitching data
-    textureMap = createTextureMap(root, infile, useProgrammerArt)
+    textureMap = createTextureMap(root, infile, packIndexes, profiler, workspace.assets)
 
-    root = scanPacksForTexture(root, infile)
-    if useProgrammerArt: root = scanPacksForTexture(root, infile, "./input/programmer_art")
+    # Later packs take priority over earlier ones (e.g. programmer art over regular texturepacks)
+    for packIndex in packIndexes: root = scanPacksForTexture(root, infile, packIndex, profiler)
 
-    outfile = os.path.splitext(os.path.join(outfolder, infile))[0] + ".png"
     if infile != outfile:
         try:
-            stitchTexture(textureMap, root, infile, outfile)
+            # Reuse the texture from the last build if none of its inputs have changed
+            cacheKey = None
+            if buildCache != None:
+                files = [os.path.join(root, infile), chooseMask(infile, getTextureInfo(os.path.join(root, infile)).width, workspace.masks)] + [textureMap[key] for key in sorted(textureMap)]
+                cacheKey = buildCache.key(files, extra=sorted(textureMap) + (["optimized"] if optimize else []))
+                data = buildCache.restore(cacheKey)
+                profiler.count("cacheHits" if data != None else "cacheMisses")
+                if data != None:
+                    output.writeBytes(outfile, data)
+                    return cacheKey
+
+            with loadTexture(os.path.join(root, infile)) as vanilla: image = stitchTexture(vanilla, textureMap, infile, useNumpy, workspace.masks)
+            profiler.count("texturesStitched")
+            # Encoding and writing happen in the background, the next leaf can be stitched in the meantime
+            # The image counts towards the output's memory budget until it's written
+            output.writeLater(outfile, functools.partial(encodeTexture, image, vanilla.format, optimize, buildCache, cacheKey, profiler), imageBytes(image))
+            return cacheKey
         except IOError:
             print("Error while generating texture for '%s'" % infile)
 
-def createTextureMap(root, infile, useProgrammerArt):
+def encodeTexture(image, format, optimize, buildCache, cacheKey, profiler) -> bytes:
+    # Finally, we encode the texture, so it can be saved to the assets folder
+    data = encodeImage(image, format)
+    image.close() # Frees the pixels right away, instead of whenever the image is garbage collected
+    if optimize:
+        with profiler.stage("optimizePng", "texture"): data = optimizePng(data)
+    if cacheKey != None: buildCache.store(cacheKey, data)
+    return data
+
+def betterleavesJsonRoot(root, infile, assetsFolder="./input/assets"):
+    # Textures from mods use the .betterleaves.json of input/assets if it has one, only their PNG comes from the mod
+    localRoot = os.path.join(assetsFolder, assetPath(root))
+    return localRoot if assetExists(os.path.join(localRoot, infile.replace(".png", ".betterleaves.json"))) else root
+
+def createTextureMap(root, infile, packIndexes=(), profiler=None, assetsFolder="./input/assets"):
     textureMap = {}
-    if os.path.isfile(os.path.join(root, infile.replace(".png", ".betterleaves.json"))):
-        with open(os.path.join(root, infile.replace(".png", ".betterleaves.json")), "r") as f:
+    root = betterleavesJsonRoot(root, infile, assetsFolder)
+    if assetExists(os.path.join(root, infile.replace(".png", ".betterleaves.json"))):
+        with openAsset(os.path.join(root, infile.replace(".png", ".betterleaves.json"))) as f:
             json_data = json.load(f)
             if "textureStitching" in json_data:
-                printOverride("Using texture stitching data from: " + f.name)
+                printOverride("Using texture stitching data from: " + os.path.join(root, infile.replace(".png", ".betterleaves.json")))
                 # Create texture map from stitching data
                 for key, value in json_data["textureStitching"].items():
                     if "-" in key:
@@ -38,40 +84,106 @@ def createTextureMap(root, infile, useProgrammerArt):
                     else: textureMap[key] = value
                 # Turn texture map into absolute paths
                 for key, value in textureMap.items():
-                    textureRoot = f"./input/assets/{value.split(':')[0]}/textures/"
+                    textureRoot = f"{assetsFolder}/{value.split(':')[0]}/textures/"
                     textureFile = value.split(":")[1] + ".png"
                     if "/" in textureFile:
                         textureRoot += textureFile.rsplit("/")[0]
                         textureFile = textureFile[len(textureFile.rsplit("/")[0])+1:] # The rest of the string, starting behind the first '/'
-                    textureRoot = scanPacksForTexture(textureRoot, textureFile)
-                    if useProgrammerArt: root = scanPacksForTexture(textureRoot, textureFile, "./input/programmer_art")
+                    for packIndex in packIndexes: textureRoot = scanPacksForTexture(textureRoot, textureFile, packIndex, profiler)
                     textureMap[key] = os.path.join(textureRoot, textureFile)
     return textureMap
 
-def stitchTexture(textureMap, root, infile, outfile):
-    # First, let's open the regular texture
-    vanilla = Image.open(os.path.join(root, infile))
+def stitchTexture(vanilla, textureMap, infile, useNumpy=False, masksFolder="./input/masks") -> Image.Image:
+    # The regular texture is already decoded by the caller
     width, height = vanilla.size
-    # Second, let's generate a transparent texture that's twice the size
-    transparent = Image.new("RGBA", [int(2 * s) for s in vanilla.size], (255, 255, 255, 0))
-    out = transparent.copy()
-
-    # Now we paste the regular texture in a 3x3 grid, centered in the middle
-    for x in range(-1, 2):
-        for y in range(-1, 2):
-            texture = vanilla
-            index = (x + 2) + (y + 1) * 3 # Turns coordinates into a number from 1 to 9
-            if str(index) in textureMap: # Load texture from texture stitching map
-                texture = Image.open(textureMap[str(index)])
-            out.paste(texture, (int(width / 2 + width * x), int(height / 2 + height * y)))
-
-    # As the last step, we apply our custom mask to round the edges and smoothen things out
-    mask_location = f"input/masks/{width}px" # If possible, use a mask designed for the texture's size
-    if not os.path.isdir(mask_location) or len(os.listdir(mask_location)) == 0: mask_location = "input/masks/16px"
-    random.seed(infile) # Use the filename as a seed. This ensures we always get the same mask per block.
-    mask_location += f"/{random.choice(os.listdir(mask_location))}" # Choose a random mask to get some variation between the different types of leaves
-    mask = Image.open(mask_location).convert('L').resize(out.size, resample=Image.NEAREST)
-    out = Image.composite(out, transparent, mask)
-
-    # Finally, we save the texture to the assets folder
-    out.save(outfile, vanilla.format)
+    # Load textures from texture stitching map, by their position in the 3x3 grid (1 to 9)
+    neighbours = {str(index): loadNeighbour(textureMap[str(index)]) for index in range(1, 10) if str(index) in textureMap}
+    # The mask is used to round the edges and smoothen things out
+    mask = loadMask(chooseMask(infile, width, masksFolder), (int(2 * width), int(2 * height)))
+
+    if useNumpy and numpyStitching() != None and numpyStitching().canStitch(vanilla, neighbours):
+        out = numpyStitching().stitchTexture(vanilla, neighbours, mask)
+    else:
+        # Second, let's generate a transparent texture that's twice the size
+        transparent = transparentCanvas(tuple(int(2 * s) for s in vanilla.size))
+        out = scratchCanvas(transparent, all(texture.size == vanilla.size for texture in neighbours.values()))
+
+        # Now we paste the regular texture in a 3x3 grid, centered in the middle
+        for x in range(-1, 2):
+            for y in range(-1, 2):
+                index = (x + 2) + (y + 1) * 3 # Turns coordinates into a number from 1 to 9
+                texture = neighbours.get(str(index), vanilla)
+                out.paste(texture, (int(width / 2 + width * x), int(height / 2 + height * y)))
+
+        # As the last step, we apply our custom mask
+        out = Image.composite(out, transparent, mask)
+    return out
+
+@functools.lru_cache(maxsize=None)
+def numpyStitching():
+    # NumPy is optional, and only imported once it's actually used, as importing it takes a while
+    try:
+        from src import numpy_stitching
+        return numpy_stitching
+    except ImportError:
+        return None
+
+def chooseMask(infile, width, masksFolder="./input/masks"):
+    # Use the filename as a seed. This ensures we always get the same mask per block.
+    # Choose a random mask to get some variation between the different types of leaves
+    return random.Random(infile).choice(listMasks(masksFolder, width))
+
+def listMasks(masksFolder, width):
+    # Listed again once masks were added or removed (which changes the folders' modification time)
+    return maskFiles(masksFolder, width, tuple(folderState(f"{masksFolder}/{size}") for size in (f"{width}px", "16px")))
+
+@functools.lru_cache(maxsize=None)
+def maskFiles(masksFolder, width, state):
+    mask_location = f"{masksFolder}/{width}px" # If possible, use a mask designed for the texture's size
+    if not os.path.isdir(mask_location) or len(os.listdir(mask_location)) == 0: mask_location = f"{masksFolder}/16px"
+    # Sorted, so the chosen mask doesn't depend on the order of files on disk
+    return tuple(f"{mask_location}/{mask}" for mask in sorted(os.listdir(mask_location)))
+
+def folderState(path):
+    return fileState(path) if os.path.isdir(path) else None
+
+# The same few masks are used for hundreds of leaves, so they are only decoded and resized once.
+# Cached images are shared, so they must never be modified.
+# The caches are keyed by the state of the file as well, so a long running process (e.g. several builds) notices changes.
+def loadMask(mask_location, size):
+    return cachedMask(mask_location, size, fileState(mask_location))
+
+@functools.lru_cache(maxsize=64)
+def cachedMask(mask_location, size, state):
+    with Image.open(mask_location) as mask:
+        return mask.convert('L').resize(size, resample=Image.NEAREST)
+
+# Stitching neighbours are usually shared by several leaves (e.g. all leaves of a tree type), so each is only decoded once.
+# Cached images are shared, so they must never be modified.
+def loadNeighbour(path):
+    return cachedNeighbour(path, assetState(path))
+
+@functools.lru_cache(maxsize=64)
+def cachedNeighbour(path, state):
+    return loadTexture(path)
+
+@functools.lru_cache(maxsize=16)
+def transparentCanvas(size):
+    return Image.new("RGBA", size, (255, 255, 255, 0))
+
+scratch = threading.local() # Canvases to paste the 3x3 grid onto, per thread and size
+
+def scratchCanvas(transparent, covered):
+    # The grid is only pasted onto the canvas and then composited into a new image, so the canvas can be reused
+    # for the next texture of the same size. If all nine tiles have the texture's size, they cover the whole canvas
+    # and nothing of the previous texture is left. Otherwise it starts out transparent, like a new one.
+    canvases = scratch.__dict__.setdefault("canvases", {})
+    if transparent.size not in canvases:
+        if len(canvases) >= 4: canvases.clear() # Only a few texture sizes are common in a pack
+        canvases[transparent.size] = transparent.copy()
+    elif not covered: canvases[transparent.size].paste(transparent)
+    return canvases[transparent.size]
+
+def imageBytes(image) -> int:
+    # Memory taken by the decoded pixels
+    return image.width * image.height * len(image.getbands())
@@ -0,0 +1,52 @@
+import json
+import struct
+from PIL import Image
+
+# Local imports
+from src.archive_utils import assetExists, assetState, openAsset, readAsset, readAssetHeader
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+class TextureInfo:
+    # Size and format of a texture, read from the PNG header without decoding the image
+    __slots__ = ("width", "height", "format", "animation")
+
+    def __init__(self, width, height, format, animation=None):
+        self.width = width
+        self.height = height
+        self.format = format
+        self.animation = animation # The "animation" section of the texture's .png.mcmeta file, if it has one
+
+    def isAnimated(self):
+        # Animated textures contain all of their frames below each other
+        return self.width != self.height
+
+textureInfos = {} # Texture path -> (state of its files, TextureInfo), for the current process
+
+def getTextureInfo(path) -> TextureInfo:
+    # Read again when the texture or its .mcmeta file changed, e.g. between two builds of a long running process
+    state = (assetState(path), assetState(path + ".mcmeta") if assetExists(path + ".mcmeta") else None)
+    cached = textureInfos.get(path)
+    if cached != None and cached[0] == state: return cached[1]
+    header = readAssetHeader(path, 24)
+    # The IHDR chunk always comes first: length, "IHDR", width, height
+    if header[:8] == PNG_SIGNATURE and header[12:16] == b"IHDR":
+        width, height = struct.unpack(">II", header[16:24])
+        info = TextureInfo(width, height, "PNG")
+    else: # Not actually a PNG, let Pillow figure it out
+        with openAsset(path) as f, Image.open(f) as texture: info = TextureInfo(texture.size[0], texture.size[1], texture.format)
+    info.animation = readAnimation(path)
+    textureInfos[path] = (state, info)
+    return info
+
+def readAnimation(path):
+    if not assetExists(path + ".mcmeta"): return None
+    try: return json.loads(readAsset(path + ".mcmeta")).get("animation")
+    except (ValueError, AttributeError): return None # Broken .mcmeta files are ignored by the game as well
+
+def loadTexture(path) -> Image.Image:
+    # Decodes the texture and closes the file right away, instead of keeping it open as long as the image lives
+    with openAsset(path) as f:
+        texture = Image.open(f)
+        texture.load()
+    return texture
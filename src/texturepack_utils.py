@@ -1,28 +1,60 @@
 import os
-import zipfile
-import shutil
+import threading
+from src.archive_utils import assetPath, listArchive
 from src.utilities import printCyan
 
-def unpackTexturepacks(rootFolder="./input/texturepacks"):
-    for root, dirs, files in os.walk(rootFolder):
-        for infile in files:
-            if infile.endswith(".zip"):
-                print("Unpacking texturepack: "+infile)
-                zf = zipfile.ZipFile(os.path.join(root, infile), 'r')
-                zf.extractall(os.path.join(root, infile.replace(".zip", "_temp")))
-                zf.close()
+class TexturepackIndex:
+    # Maps the asset path of every texture (e.g. "/minecraft/textures/block", "oak_leaves.png")
+    # to the folder in a texturepack that provides it.
+    # Zipped packs are indexed in place, without extracting them. The first match wins.
+    # Folders that are already known (e.g. the ones in mods) can be passed instead of walking the root folder.
+    def __init__(self, rootFolder="./input/texturepacks", folders=None):
+        self.rootFolder = rootFolder
+        self.textures = {}
+        if folders != None:
+            for root, files in folders.items():
+                for infile in files: self.add(root, infile)
+            return
+        for root, dirs, files in os.walk(rootFolder):
+            dirs.sort()
+            for infile in sorted(files):
+                if infile.endswith(".zip"):
+                    print("Indexing texturepack: "+infile)
+                    for member in listArchive(os.path.join(root, infile)):
+                        self.add(os.path.join(root, infile, os.path.dirname(member)), os.path.basename(member))
+                else: self.add(root, infile)
 
-def cleanupTexturepacks(rootFolder="./input/texturepacks"):
-    for root, dirs, files in os.walk(rootFolder):
-        for folder in dirs:
-            if folder.endswith("_temp"):
-                shutil.rmtree(os.path.join(root, folder))
+    def add(self, root, infile):
+        if infile.endswith(".png") and assetPath(root) != "":
+            self.textures.setdefault((assetPath(root), infile), root)
+
+    def lookup(self, baseRoot, baseInfile):
+        if assetPath(baseRoot) == "": return None
+        return self.textures.get((assetPath(baseRoot), baseInfile))
 
-def scanPacksForTexture(baseRoot, baseInfile, rootFolder="./input/texturepacks"):
+indexes = {} # (folder, state of its files) -> TexturepackIndex, shared by all builds of the process
+indexesLock = threading.Lock()
+
+def loadTexturepackIndex(rootFolder):
+    # Indexes are only read once they're created, so builds running at the same time can share them.
+    # An index is created again once a file in the folder is added, removed or modified.
+    state = []
     for root, dirs, files in os.walk(rootFolder):
-        for infile in files:
-            if "assets" in root and "assets" in baseRoot:
-                if infile.endswith(".png") and (len(root.split("/")) > 3) and (baseInfile == infile) and (root.split("assets")[1] == baseRoot.split("assets")[1]):
-                    printCyan(" Using texture from: " + root.split("assets")[0].replace(rootFolder, ""))
-                    return root;
-    return baseRoot
+        dirs.sort()
+        for infile in sorted(files):
+            stat = os.stat(os.path.join(root, infile))
+            state.append((os.path.join(root, infile), stat.st_mtime_ns, stat.st_size))
+    key = (os.path.abspath(rootFolder), tuple(state))
+    with indexesLock:
+        if key not in indexes:
+            for outdated in [other for other in indexes if other[0] == key[0]]: del indexes[outdated]
+            indexes[key] = TexturepackIndex(rootFolder)
+        return indexes[key]
+
+def scanPacksForTexture(baseRoot, baseInfile, packIndex: TexturepackIndex, profiler=None):
+    root = packIndex.lookup(baseRoot, baseInfile)
+    if profiler != None: profiler.count("packLookups")
+    if root == None: return baseRoot
+    if profiler != None: profiler.count("packOverrides")
+    printCyan(" Using texture from: " + root.rsplit("/assets/", 1)[0].replace(packIndex.rootFolder, "") + "/")
+    return root
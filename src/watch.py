@@ -0,0 +1,147 @@
+import json
+import os
+import time
+
+# Local imports
+from src.archive_utils import assetPath, closeArchives
+from src.build_cache import BuildCache
+from src.data.edition import Edition
+from src.data.overrides import Overrides
+from src.data.workspace import Workspace
+from src.generator import planLeaves, planLeaf, planModLeaf, generateLeafJson, buildDependencyGraph, addLeafToGraph
+from src.mod_utils import scanModsForTextures
+from src.output_utils import AssetTree, JsonBuffer
+from src.parallel_utils import TextureWorkers
+from src.texture_generator import maskFiles, cachedMask, cachedNeighbour, textureOutfile
+from src.texture_info import textureInfos
+from src.texturepack_utils import TexturepackIndex
+from src.utilities import printCyan
+
+# Above this many affected leaves, the textures are rendered in parallel (starting the processes takes a moment)
+PARALLEL_THRESHOLD = 32
+
+def watchedPaths(workspace):
+    # Files and folders that are watched for changes. Changes to the input assets and the masks are handled leaf by leaf,
+    # everything else (added or removed masks, packs, mods, overrides) plans all leaves again.
+    return (workspace.assets, workspace.masks, workspace.texturepacks, workspace.programmerArt, workspace.mods, workspace.overrides)
+
+def snapshot(paths):
+    # Polling is enough for a few thousand files and doesn't need any platform specific watcher
+    files = {}
+    for path in paths:
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            files[path] = (stat.st_mtime_ns, stat.st_size)
+        for root, dirs, names in os.walk(path):
+            for name in names:
+                stat = os.stat(os.path.join(root, name))
+                files[os.path.join(root, name)] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+class WatchSession:
+    # Keeps the overrides, indexes, planned leaves and decoded masks of a build in memory
+    # and only regenerates the parts of the pack that are affected by a change
+    def __init__(self, args, output, onUpdate=None, workspace=Workspace()):
+        self.args = args
+        self.output = output
+        self.workspace = workspace
+        self.onUpdate = onUpdate # Called after every (re)build, e.g. to zip up the pack
+        self.profiler = output.profiler
+        self.buildCache = None if args.no_cache else BuildCache(Edition.fromArgs(args).name, workspace.buildCache)
+        self.baseAssets = AssetTree()
+        self.baseAssets.copyTree(workspace.base, "assets", args.minify)
+        self.leaves = {} # (root, infile) -> planned leaf, in build order
+        self.graph = None # Input files each leaf's files are made from
+        self.jsonFiles = {} # Blockstates and models written by the last build
+        self.textures = set() # Textures written by the last build
+
+    def rebuild(self):
+        # Plans all leaves again, textures that didn't change are restored from the build cache.
+        # The caches notice changed files by themselves, they're only cleared to drop what's no longer used.
+        closeArchives()
+        textureInfos.clear()
+        maskFiles.cache_clear()
+        cachedMask.cache_clear()
+        cachedNeighbour.cache_clear()
+        with open(self.workspace.overrides) as f: self.overrides = Overrides(json.load(f))
+        self.modFolders = scanModsForTextures(self.workspace.mods)
+        self.mods = TexturepackIndex(self.workspace.mods, self.modFolders)
+        self.packIndexes = [self.mods, TexturepackIndex(self.workspace.texturepacks)] + ([TexturepackIndex(self.workspace.programmerArt)] if self.args.programmer else [])
+        self.output.clear()
+        self.output.copyTree(self.workspace.base, "assets", self.args.minify)
+        self.jsonFiles = {}
+        self.textures = set()
+        self.leaves = {(leaf.root, leaf.infile): leaf for leaf in planLeaves(self.overrides, self.args.legacy, self.profiler, self.modFolders, self.mods, self.workspace.assets)}
+        self.graph = buildDependencyGraph(self.leaves.values(), self.packIndexes, self.workspace)
+        self.generate(self.leaves.values(), self.args.jobs)
+
+    def update(self, changed, listed=()):
+        # listed contains the files that were added or removed
+        assets, masks = self.workspace.assets + "/", self.workspace.masks + "/"
+        if any(not path.startswith((assets, masks)) or (path.startswith(masks) and path in listed) for path in changed): return self.rebuild()
+
+        # The graph knows all leaves that use a changed texture, sidecar file or mask. New textures and sidecar files
+        # aren't in the graph yet, they (also) affect the leaf they belong to.
+        affected = self.graph.affectedLeaves(changed)
+        for path in changed:
+            if not path.startswith(assets): continue
+            texture = path.replace(".betterleaves.json", ".png").removesuffix(".mcmeta")
+            affected.add((os.path.dirname(texture), os.path.basename(texture)))
+
+        keys = set()
+        for root, infile in affected:
+            modRoot = self.mods.lookup(root, infile) if infile.endswith(".png") else None
+            if modRoot != None: # The texture comes from a mod, a changed .betterleaves.json may come from either place
+                root = modRoot
+                self.leaves[(root, infile)] = planModLeaf(root, self.modFolders[root], infile, self.overrides, self.args.legacy, self.workspace.assets)
+                addLeafToGraph(self.graph, self.leaves[(root, infile)], self.packIndexes, self.workspace)
+            elif os.path.isfile(os.path.join(root, infile)) and infile.endswith(".png") and assetPath(root) != "":
+                self.leaves[(root, infile)] = planLeaf(root, os.listdir(root), infile, self.overrides, self.args.legacy)
+                addLeafToGraph(self.graph, self.leaves[(root, infile)], self.packIndexes, self.workspace)
+            elif (root, infile) in self.leaves: # Removed
+                del self.leaves[(root, infile)]
+                self.graph.removeLeaf((root, infile))
+            keys.add((root, infile))
+        leaves = [self.leaves[key] for key in keys if key in self.leaves]
+        self.generate(leaves, self.args.jobs if len(leaves) > PARALLEL_THRESHOLD else 1)
+
+    def generate(self, leaves, jobs):
+        # Renders the textures of the given leaves, but regenerates the blockstates and models of all leaves,
+        # as several leaves can add to the same blockstate. Only files that actually changed are written.
+        with TextureWorkers(jobs, self.output, self.packIndexes, self.buildCache, self.args.numpy, self.args.optimize_png, self.workspace) as textureWorkers:
+            for leaf in leaves:
+                # The old texture must not stay around if the new one can't be generated (e.g. a neighbour was removed)
+                if self.output.exists(textureOutfile(leaf.root, leaf.infile)): self.output.remove(textureOutfile(leaf.root, leaf.infile))
+                if not leaf.skipped and leaf.should_generate_texture: textureWorkers.submit(leaf.root, leaf.infile)
+
+        jsonBuffer = JsonBuffer(self.output, self.baseAssets, self.args.minify)
+        for leaf in self.leaves.values():
+            if not leaf.skipped: generateLeafJson(leaf, jsonBuffer)
+        self.jsonFiles = jsonBuffer.flush(self.jsonFiles)
+
+        # Textures of removed leaves (or leaves that don't get a texture anymore)
+        textures = {textureOutfile(leaf.root, leaf.infile) for leaf in self.leaves.values() if not leaf.skipped and leaf.should_generate_texture}
+        for texture in self.textures - textures:
+            if self.baseAssets.exists(texture): self.output.writeBytes(texture, self.baseAssets.readBytes(texture))
+            elif self.output.exists(texture): self.output.remove(texture)
+        self.textures = textures
+        self.output.flush()
+        if self.onUpdate != None: self.onUpdate()
+
+    def watch(self, interval=0.5):
+        self.rebuild()
+        state = snapshot(watchedPaths(self.workspace))
+        printCyan("Watching for changes, press Ctrl+C to stop")
+        while True:
+            time.sleep(interval)
+            current = snapshot(watchedPaths(self.workspace))
+            changed = {path for path in state.keys() | current.keys() if state.get(path) != current.get(path)}
+            if len(changed) == 0: continue
+            listed = {path for path in changed if (path in state) != (path in current)}
+            state = current
+            start = time.perf_counter()
+            try: self.update(changed, listed)
+            except Exception as e: # Keep watching, the file is probably still being written
+                print(f"Error while updating: {e!r}")
+                continue
+            printCyan("Updated {} changed file(s) in {} ms".format(len(changed), round((time.perf_counter() - start) * 1000)))
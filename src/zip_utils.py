@@ -1,20 +1,109 @@
+import collections
+import hashlib
 import os
+import time
 import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 
-# See https://stackoverflow.com/a/1855118
-def zipdir(path, ziph):
-    # ziph is zipfile handle
+# Compression level per file extension ("" for all others), None stores the file uncompressed.
+# PNGs are already deflate-compressed, so "fast" doesn't even try.
+COMPRESSION = {
+    "fast": {".png": None, "": 1},
+    "max": {".png": 9, "": 9}
+}
+# Threads that compress entries, like the default of ThreadPoolExecutor
+ZIP_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+# Fixed timestamp for all entries, so that building the same assets twice results in the same zip file
+TIMESTAMP = (1980, 1, 1, 0, 0, 0)
+
+# Lists the files in a folder as zip entries (arcname -> file path), like https://stackoverflow.com/a/1855118
+def zipdir(path, exclude=()):
+    entries = {}
     for root, dirs, files in os.walk(path):
         for file in files:
-            ziph.write(os.path.join(root, file),
-                       os.path.relpath(os.path.join(root, file),
-                                       os.path.join(path, '..')))
-
-# Creates a compressed zip file
-def makeZip(filename, programmer_art=False):
-    with zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED, compresslevel=9) as zipf:
-        zipdir('assets/', zipf)
-        zipf.write('pack.mcmeta')
-        zipf.write('pack_programmer_art.png', arcname='pack.png') if programmer_art else zipf.write('pack.png')
-        zipf.write('LICENSE')
-        zipf.write('README.md')
+            arcname = os.path.relpath(os.path.join(root, file), os.path.join(path, '..'))
+            if arcname not in exclude: entries[arcname] = os.path.join(root, file)
+    return entries
+
+def compressEntry(arcname, source, compression):
+    # Runs on a worker thread, zlib and hashlib release the GIL while compressing and hashing
+    if not isinstance(source, bytes):
+        with open(source, "rb") as f: source = f.read()
+    digest = hashlib.sha256(source).hexdigest()
+    levels = COMPRESSION[compression]
+    level = levels.get(os.path.splitext(arcname)[1], levels[""])
+    if level != None:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15) # Raw deflate stream, as stored in zip files
+        compressed = compressor.compress(source) + compressor.flush()
+        if len(compressed) < len(source): return source, compressed, digest
+    return source, None, digest
+
+def writeEntry(zipf, arcname, data, compressed):
+    # zipfile can only compress entries itself (on one core, one after another),
+    # so the already compressed data is written the same way ZipFile.writestr would
+    zinfo = zipfile.ZipInfo(arcname.replace(os.sep, "/"), TIMESTAMP)
+    zinfo.create_system = 3
+    zinfo.external_attr = 0o644 << 16
+    zinfo.compress_type = zipfile.ZIP_STORED if compressed == None else zipfile.ZIP_DEFLATED
+    zinfo.file_size = len(data)
+    zinfo.compress_size = len(data) if compressed == None else len(compressed)
+    zinfo.CRC = zlib.crc32(data)
+    appendRawEntry(zipf, zinfo, data if compressed == None else compressed)
+    return zinfo
+
+def appendRawEntry(zipf, zinfo, payload):
+    # The only place that touches ZipFile's internals (fp, filelist, NameToInfo, start_dir, _didModify),
+    # checked against CPython 3.10 to 3.13. writeEntries tests every zip after writing it, so a change
+    # in the standard library fails the build instead of producing a broken zip.
+    zinfo.header_offset = zipf.fp.tell()
+    zipf.fp.write(zinfo.FileHeader())
+    zipf.fp.write(payload)
+    zipf.filelist.append(zinfo)
+    zipf.NameToInfo[zinfo.filename] = zinfo
+    zipf.start_dir = zipf.fp.tell()
+    zipf._didModify = True
+
+def writeEntries(filename, entries, compression="max", profiler=None):
+    # Creates a compressed zip file, compressing the entries in parallel and in a reproducible order.
+    # Only a few entries per thread are compressed ahead of the one that's written next, so that the compressed
+    # pack isn't held in memory at once. Returns the manifest of the zip: the size, CRC and SHA-256 hash of every entry.
+    manifest = {}
+    pending = collections.deque() # (arcname, future), in the order they're written
+    with zipfile.ZipFile(filename, 'w') as zipf, ThreadPoolExecutor(ZIP_WORKERS) as executor:
+        for arcname in sorted(entries):
+            pending.append((arcname, executor.submit(compressEntry, arcname, entries[arcname], compression)))
+            if len(pending) >= 2 * ZIP_WORKERS: writeCompressed(zipf, *pending.popleft(), manifest, profiler)
+        while len(pending) > 0: writeCompressed(zipf, *pending.popleft(), manifest, profiler)
+    checkZip(filename, manifest)
+    return manifest
+
+def writeCompressed(zipf, arcname, future, manifest, profiler):
+    # The data of the entry is released once it's written
+    data, compressed, digest = future.result()
+    zinfo = writeEntry(zipf, arcname, data, compressed)
+    manifest[zinfo.filename] = {"size": zinfo.file_size, "crc32": zinfo.CRC, "sha256": digest}
+    if profiler != None:
+        profiler.count("zipEntriesStored" if compressed == None else "zipEntriesDeflated")
+        profiler.count("zipBytes", len(data) if compressed == None else len(compressed))
+
+def checkZip(filename, manifest):
+    # Reads the zip back with zipfile: every entry must be listed and pass its CRC check
+    with zipfile.ZipFile(filename) as zipf:
+        broken = zipf.testzip()
+        if broken != None: raise zipfile.BadZipFile(f"{filename}: entry '{broken}' is broken")
+        if {info.filename: (info.file_size, info.CRC) for info in zipf.infolist()} != {name: (entry["size"], entry["crc32"]) for name, entry in manifest.items()}:
+            raise zipfile.BadZipFile(f"{filename}: the entries don't match the ones that were written")
+
+def createMetadata(version, edition, metadataFile="./input/pack.mcmeta"):
+    with open(metadataFile) as infile:
+        return "".join(line.replace("${version}", version).replace("${edition}", edition).replace("${year}", str(time.localtime().tm_year)) for line in infile)
+
+def makeZip(filename, output, programmer_art=False, metadata=None, compression="max", root="."):
+    # The icon, license and readme are taken from the root folder, like pack.mcmeta unless its content is given
+    entries = output.zipEntries()
+    entries['pack.mcmeta'] = os.path.join(root, 'pack.mcmeta') if metadata == None else metadata.encode()
+    entries['pack.png'] = os.path.join(root, 'pack_programmer_art.png' if programmer_art else 'pack.png')
+    entries['LICENSE'] = os.path.join(root, 'LICENSE')
+    entries['README.md'] = os.path.join(root, 'README.md')
+    return writeEntries(filename, entries, compression, output.profiler)